@@ -4,6 +4,8 @@ import math
 import random
 from dataclasses import dataclass
 
+import numpy as np
+
 from maptool.geometry import essentially_zero
 
 
@@ -13,10 +15,10 @@ class Boid:
     see: https://github.com/sowmya214/boids_implementation
     """
 
-    def __init__(self, room):
+    def __init__(self, room, angle=None, rng=random):
         self.room = room
         self.center = room.center
-        self.angle = random.uniform(0.0, 2.0 * math.pi)
+        self.angle = rng.uniform(0.0, 2.0 * math.pi) if angle is None else angle
 
     def euclidean_dist(self, other):
         return self.room.euclidean_dist(other.room)
@@ -45,6 +47,173 @@ class Boid:
             print(f"angle: {self.angle}")
 
 
+class BoidGrid:
+    """
+    Uniform grid over the boid centers with cells of at least min_separation.
+
+    Any boid within min_separation of a point is in the 3x3 block of cells
+    around it, so the flocking loop only needs to measure those. The cell
+    size is padded slightly so rounding in the cell calculation can never
+    push a boid at exactly min_separation into the next cell out.
+
+    Boids whose centers are not finite can't be placed, they are kept in a
+    separate set and treated as near to everything. For bit-identical results
+    with the exhaustive search, candidates are always returned in boid order.
+    """
+
+    PADDING = 1.0001
+
+    def __init__(self, boids, min_separation):
+        self.boids = boids
+        self.cell_size = min_separation * self.PADDING if min_separation > 0 else 1.0
+        self.cells = {}
+        self.unplaced = set()
+        self.keys = [None] * len(boids)
+        for i in range(len(boids)):
+            self.update(i)
+
+    def _key(self, boid):
+        try:
+            return (
+                math.floor(boid.center.x / self.cell_size),
+                math.floor(boid.center.y / self.cell_size),
+            )
+        except (ValueError, OverflowError):
+            return None
+
+    def update(self, i):
+        """re-file boid i after its center has moved"""
+        key = self._key(self.boids[i])
+        old = self.keys[i]
+        if old == key and (key is not None or i in self.unplaced):
+            return
+        if old is not None:
+            cell = self.cells[old]
+            cell.remove(i)
+            if not cell:
+                del self.cells[old]
+        else:
+            self.unplaced.discard(i)
+        self.keys[i] = key
+        if key is None:
+            self.unplaced.add(i)
+            return
+        self.cells.setdefault(key, set()).add(i)
+
+    def candidates(self, i):
+        """indices of the boids, other than i, that may be within min_separation of boid i"""
+        key = self.keys[i]
+        if key is None:
+            return [j for j in range(len(self.boids)) if j != i]
+        found = set(self.unplaced)
+        cx, cy = key
+        for x in (cx - 1, cx, cx + 1):
+            for y in (cy - 1, cy, cy + 1):
+                found.update(self.cells.get((x, y), ()))
+        found.discard(i)
+        return sorted(found)
+
+
+class BoidArrays:
+    """
+    Array backed flocking engine for the separation and flock moves.
+
+    Centers and angles are held in contiguous float64 arrays and the pairwise
+    distances are computed for all boids at once. The engine keeps the
+    distance matrix, which boids are within min_separation of each other and
+    each boid's neighbour count, so boids with no neighbours are skipped
+    without being visited. When a boid moves only its row and column are
+    refreshed.
+
+    Boids still move one after the other, exactly as Boid does, so a boid
+    sees the moves already made earlier in the same pass and the results
+    match the scalar engine bit for bit.
+    """
+
+    def __init__(self, rooms, angles, min_separation):
+        self.rooms = rooms
+        self.min_separation = min_separation
+        self.x = np.array([r.center.x for r in rooms], dtype=np.float64)
+        self.y = np.array([r.center.y for r in rooms], dtype=np.float64)
+        self.angles = np.array(angles, dtype=np.float64)
+
+        dx = self.x[np.newaxis, :] - self.x[:, np.newaxis]
+        dy = self.y[np.newaxis, :] - self.y[:, np.newaxis]
+        self.d = np.sqrt(dx * dx + dy * dy)
+        self.near = self._near(self.d)
+        np.fill_diagonal(self.near, False)
+        self.counts = np.count_nonzero(self.near, axis=1)
+
+    def _near(self, d):
+        # not (d > min_separation) rather than d <= min_separation so that
+        # NaN distances count as neighbours, as they do for Boid
+        return ~(d > self.min_separation)
+
+    def distances(self, i):
+        """the distance from boid i to every boid"""
+        dx = self.x - self.x[i]
+        dy = self.y - self.y[i]
+        return np.sqrt(dx * dx + dy * dy)
+
+    def _moved(self, i):
+        d = self.distances(i)
+        self.d[i, :] = d
+        self.d[:, i] = d
+        near = self._near(d)
+        near[i] = False
+        self.counts += near
+        self.counts -= self.near[:, i]
+        self.counts[i] = np.count_nonzero(near)
+        self.near[i, :] = near
+        self.near[:, i] = near
+
+    def flock_pass(self, shortest_dist, tan_fudge=0.0001, distance=10.0):
+        """
+        Run one separation and flock pass over all boids.
+
+        Returns the total neighbour count, the same figure the scalar loop
+        reports. The room centers are updated when the pass completes.
+        """
+        x, y, angles = self.x, self.y, self.angles
+        neighbouring = 0
+
+        i = 0
+        while True:
+            waiting = np.flatnonzero(self.counts[i:])
+            if not len(waiting):
+                break
+            i += int(waiting[0])
+            neighbouring += int(self.counts[i])
+
+            xi, yi = float(x[i]), float(y[i])
+            d = self.d[i]
+            closer = self.near[i] & (d < shortest_dist)
+            j = int(np.argmin(np.where(closer, d, np.inf)))
+            angle = float(angles[i])
+            if closer[j] and not d[j] >= self.min_separation:
+                if essentially_zero(float(x[j]) - xi):
+                    delta = math.atan((float(y[j]) - yi) / tan_fudge)
+                else:
+                    delta = math.atan((float(y[j]) - yi) / (float(x[j]) - xi))
+                angle -= delta
+                angles[i] = angle
+
+            try:
+                x[i] = xi + distance * math.cos(angle)
+                y[i] = yi + distance * math.sin(angle)
+            except ValueError:
+                print(f"angle: {angle}")
+            else:
+                self._moved(i)
+            i += 1
+
+        for i, r in enumerate(self.rooms):
+            r.center.x = float(x[i])
+            r.center.y = float(y[i])
+
+        return neighbouring
+
+
 def alignment(boid, neighbours, rate=100.0):
     """move 2: orient towards the neighbours - alignment"""
 
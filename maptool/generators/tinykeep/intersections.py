@@ -20,10 +20,62 @@ _fields = "ir side ic jc ileg jleg pi".split()
 Crossing = namedtuple("Crossing", _fields, defaults=(None,) * len(_fields))
 
 
+def side_pairs(side_corridors):
+    """every ordered pair of distinct corridors from a room side
+
+    In the order of the nested loops over side_corridors the scans have
+    always used. The corridor checks are not symmetric so (ic, jc) and
+    (jc, ic) are both produced.
+    """
+    side_corridors = list(side_corridors)
+    for ic in side_corridors:
+        for jc in side_corridors:
+            if ic != jc:
+                yield ic, jc
+
+
 class GenerateIntersections:
-    def __init__(self, rooms, corridors):
+    def __init__(self, rooms, corridors, room_index=None):
         self.rooms = rooms
         self.corridors = corridors
+        # if provided, intersection rooms are added to the index as they are created
+        self.room_index = room_index
+        # (ic, jc, margin_factor) -> (ic version, jc version, check_entangled result)
+        self._entangled = {}
+        # ic -> version of corridors[ic].points, absent until they first change
+        self._versions = {}
+
+    def changed(self, *corridors):
+        """record that the points of corridors have changed, see corridors_entangled"""
+        for ic in corridors:
+            self._versions[ic] = self._versions.get(ic, 0) + 1
+
+    def corridors_entangled(self, ic, jc, margin_factor=None):
+        """corridors[ic].check_entangled(corridors[jc]), memoised
+
+        The result is re-used until changed is called for either corridor.
+        The snap and the merges call it for the corridors they edit, a merge
+        only edits the corridors it is given. check_entangled is not
+        symmetric, (ic, jc) and (jc, ic) are cached separately.
+        """
+        key = (ic, jc, margin_factor)
+        a, b = self._versions.get(ic, 0), self._versions.get(jc, 0)
+        cached = self._entangled.get(key)
+        if cached is not None and cached[0] == a and cached[1] == b:
+            return cached[2]
+
+        entangled = self.corridors[ic].check_entangled(
+            self.corridors[jc], margin_factor=margin_factor
+        )
+        self._entangled[key] = (a, b, entangled)
+        return entangled
+
+    def _add_room(self, room) -> int:
+        irn = len(self.rooms)
+        self.rooms.append(room)
+        if self.room_index is not None:
+            self.room_index.add(irn)
+        return irn
 
     # ---
 
@@ -329,8 +381,7 @@ class GenerateIntersections:
         rn = Room()  # intersection
         rn.is_intersection = True
         rn.center = cx.pi.clone()
-        irn = len(self.rooms)
-        self.rooms.append(rn)
+        irn = self._add_room(rn)
 
         # --- new corridor
         # new corridor from rn to r3 (replacing the portion of ca after the new intersection)
@@ -407,6 +458,7 @@ class GenerateIntersections:
 
     def merge_crossing(self, cx: Crossing):
         """Merge a crossing corridor pair which leave the same room"""
+        self.changed(cx.ic, cx.jc)
         # todo chose from the major cases
         return self._merge_crossing_hvl(cx)
 
@@ -439,8 +491,7 @@ class GenerateIntersections:
         rn = Room()  # intersection
         rn.is_intersection = True
         rn.center = cb.points[1]
-        irn = len(self.rooms)
-        self.rooms.append(rn)
+        irn = self._add_room(rn)
 
         # --- new corridor
         # new corridor from r1 to rn, replacing the co-incident sections of the entangled pair
@@ -559,8 +610,7 @@ class GenerateIntersections:
         rn = Room()  # intersection
         rn.is_intersection = True
         rn.center = cb.points[1]
-        irn = len(self.rooms)
-        self.rooms.append(rn)
+        irn = self._add_room(rn)
 
         # --- new corridor
         # new corridor from r1 to rn
@@ -640,40 +690,65 @@ class GenerateIntersections:
                 # intersections have zero widith & length so we need on point of
                 # co-incidence plust another on the same x or same y as the co-incident
 
-                for ic in side_corridors:
-                    for jc in side_corridors:
-                        if ic == jc:
-                            continue
-
-                        if self.corridors[ic].check_entangled(self.corridors[jc]):
-                            continue
-                        entangled = self.corridors[ic].check_entangled(
-                            self.corridors[jc], margin_factor=margin_factor
+                for ic, jc in side_pairs(side_corridors):
+
+                    if self.corridors_entangled(ic, jc):
+                        continue
+                    entangled = self.corridors_entangled(
+                        ic, jc, margin_factor=margin_factor
+                    )
+                    if not entangled:
+                        continue
+
+                    # ok so the corridor would be entangled if we allow for the margin_factor so snap the co-incident legs together
+
+                    (p1, p2, i, j, opposed) = entangled
+
+                    # are the co-incident legs horizontal or vertical ?
+                    ca, cb = self.corridors[ic], self.corridors[jc]
+                    if g.essentially_equal(ca.points[i].y, ca.points[i + 1].y):
+                        # horizontal
+                        y = (ca.points[i].y + cb.points[j].y) / 2.0
+                        ca.points[i].y = cb.points[j].y = ca.points[
+                            i + 1
+                        ].y = cb.points[j + 1].y = y
+                    else:
+                        x = (ca.points[i].x + cb.points[j].x) / 2.0
+                        ca.points[i].x = cb.points[j].x = ca.points[
+                            i + 1
+                        ].x = cb.points[j + 1].x = x
+                    self.changed(ic, jc)
+                    if not self.corridors_entangled(ic, jc):
+                        print(
+                            "the result of a snap should be an entangled corridor pair"
                         )
-                        if not entangled:
-                            continue
-
-                        # ok so the corridor would be entangled if we allow for the margin_factor so snap the co-incident legs together
-
-                        (p1, p2, i, j, opposed) = entangled
-
-                        # are the co-incident legs horizontal or vertical ?
-                        ca, cb = self.corridors[ic], self.corridors[jc]
-                        if g.essentially_equal(ca.points[i].y, ca.points[i + 1].y):
-                            # horizontal
-                            y = (ca.points[i].y + cb.points[j].y) / 2.0
-                            ca.points[i].y = cb.points[j].y = ca.points[
-                                i + 1
-                            ].y = cb.points[j + 1].y = y
-                        else:
-                            x = (ca.points[i].x + cb.points[j].x) / 2.0
-                            ca.points[i].x = cb.points[j].x = ca.points[
-                                i + 1
-                            ].x = cb.points[j + 1].x = x
-                        if not self.corridors[ic].check_entangled(self.corridors[jc]):
-                            print(
-                                "the result of a snap should be an entangled corridor pair"
-                            )
+
+    def _first_entangled_in_side(self, i, side, side_corridors):
+
+        # for each pair m, n of corridors see if they are actually
+        # co-incident.  corridors joining intersections will touch as
+        # intersections have zero widith & length so we need on point of
+        # co-incidence plust another on the same x or same y as the co-incident
+
+        for ic, jc in side_pairs(side_corridors):
+            if self.corridors_entangled(ic, jc):
+                return ic, jc
+
+    def _first_crossing_in_side(self, i, side, side_corridors):
+
+        for ic, jc in side_pairs(side_corridors):
+            crossing = self.corridors[ic].check_crossing(self.corridors[jc])
+            if crossing:
+                ileg, jleg, pi = crossing
+                return Crossing(
+                    ir=i,
+                    side=side,
+                    ic=ic,
+                    jc=jc,
+                    ileg=ileg,
+                    jleg=jleg,
+                    pi=pi,
+                )
 
     def find_first_entangled_corridor_pair(self):
         for i, r in enumerate(self.rooms):
@@ -683,20 +758,9 @@ class GenerateIntersections:
                 if len(side_corridors) <= 1:
                     continue
 
-                # for each pair m, n of corridors see if they are actually
-                # co-incident.  corridors joining intersections will touch as
-                # intersections have zero widith & length so we need on point of
-                # co-incidence plust another on the same x or same y as the co-incident
-
-                for ic in side_corridors:
-                    for jc in side_corridors:
-                        if ic == jc:
-                            continue
-
-                        if not self.corridors[ic].check_entangled(self.corridors[jc]):
-                            continue
-
-                        return ic, jc
+                found = self._first_entangled_in_side(i, side, side_corridors)
+                if found:
+                    return found
 
     def find_first_crossing_from_same_room(self):
         """find the first pair of crossing corridors that exit the same room
@@ -715,28 +779,17 @@ class GenerateIntersections:
                 if len(side_corridors) <= 1:
                     continue
 
-                # for each pair m, n of corridors see if they are actually
-                # co-incident.  corridors joining intersections will touch as
-                # intersections have zero widith & length so we need on point of
-                # co-incidence plust another on the same x or same y as the co-incident
+                found = self._first_crossing_in_side(i, side, side_corridors)
+                if found:
+                    return found
+
+    def entangled_worklist(self):
+        """a SideWorklist giving the same pairs as find_first_entangled_corridor_pair"""
+        return SideWorklist(self, self._first_entangled_in_side)
 
-                for ic in side_corridors:
-                    for jc in side_corridors:
-                        if ic == jc:
-                            continue
-
-                        crossing = self.corridors[ic].check_crossing(self.corridors[jc])
-                        if crossing:
-                            ileg, jleg, pi = crossing
-                            return Crossing(
-                                ir=i,
-                                side=side,
-                                ic=ic,
-                                jc=jc,
-                                ileg=ileg,
-                                jleg=jleg,
-                                pi=pi,
-                            )
+    def crossing_worklist(self):
+        """a SideWorklist giving the same crossings as find_first_crossing_from_same_room"""
+        return SideWorklist(self, self._first_crossing_in_side)
 
     def generate_corridor_intersection(self, ic, jc):
         """merge a single pair of entangled corridors"""
@@ -746,6 +799,9 @@ class GenerateIntersections:
             print(f"{ic} & {jc} are not entangled")
             return False
 
+        # each merge below edits the points of both
+        self.changed(ic, jc)
+
         if len(c1.points) + len(c2.points) == 6:
             self._merge_ll(ic, jc)
             if c1.check_entangled(c2):
@@ -764,3 +820,65 @@ class GenerateIntersections:
             if c1.check_entangled(c2):
                 print(f"merge_straights failed to disentangle {ic}, {jc}")
             return True
+
+
+class SideWorklist:
+    """
+    Finds the first corridor pair, in room then side order, that a check
+    reports on, without rescanning every room side after each fix.
+
+    The check result for each (room, side) is cached. Before a fix, call touch
+    with the corridors it is given, after it call refresh. The merges only
+    change the corridors they are given and the corridors they create, and a
+    corridor is only ever listed on the sides of the rooms it joins. So
+    refresh re-checks every side of the rooms those corridors joined before
+    and join after, and of any new rooms. first then returns exactly what a
+    full rescan would.
+    """
+
+    def __init__(self, gi, check):
+        self.gi = gi
+        self.check = check
+        self.found = {}
+        self._touch_reset()
+        self._check_rooms(range(len(gi.rooms)))
+
+    def _touch_reset(self):
+        self.touched = set()
+        self.touched_rooms = set()
+        self.ncorridors = len(self.gi.corridors)
+        self.nrooms = len(self.gi.rooms)
+
+    def touch(self, *corridors):
+        """record the corridors the next fix is given"""
+        for ic in corridors:
+            self.touched.add(ic)
+            self.touched_rooms.update(self.gi.corridors[ic].joins)
+
+    def refresh(self):
+        """re-check the room sides affected by the fix since touch"""
+
+        rooms = self.touched_rooms
+        rooms.update(range(self.nrooms, len(self.gi.rooms)))
+        for ic in self.touched.union(range(self.ncorridors, len(self.gi.corridors))):
+            rooms.update(self.gi.corridors[ic].joins)
+        self._check_rooms(rooms)
+        self._touch_reset()
+
+    def _check_rooms(self, rooms):
+        for i in rooms:
+            r = self.gi.rooms[i]
+            for side in range(4):
+                side_corridors = set(r.corridors[side])
+                found = None
+                if len(side_corridors) > 1:
+                    found = self.check(i, side, side_corridors)
+                if found:
+                    self.found[(i, side)] = found
+                else:
+                    self.found.pop((i, side), None)
+
+    def first(self):
+        if not self.found:
+            return None
+        return self.found[min(self.found)]
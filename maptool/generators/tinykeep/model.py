@@ -1,8 +1,11 @@
 """generative, simulation based, model"""
+import copy
 import enum
+import os
 from ntpath import join
 import sys
 import json
+import time
 import math
 import random
 from dataclasses import dataclass
@@ -14,12 +17,13 @@ from scipy.spatial import Delaunay
 from maptool.datatypes import GenArena, Vec2, Box
 from maptool.generators.tinykeep.intersections import GenerateIntersections
 from maptool.randprimitives import rand_room
-from maptool.room import GenRoom, Room, RoomSide, rooms_crossing_line
+from maptool.room import GenRoom, Room, RoomIndex, RoomSide
 from maptool.corridor import Corridor
+from maptool.store import MapStore
 
 from maptool import geometry as g
 
-from .flock import Boid
+from .flock import Boid, BoidArrays, BoidGrid
 from .view_svg import Viewer, RenderOpts
 
 
@@ -27,6 +31,46 @@ class Error(Exception):
     """general error in the tinykeep model"""
 
 
+class ConvergenceError(Error):
+    """
+    The rooms did not separate within the flocking budget.
+
+    passes is the number of passes run, trend the neighbour counts of the most
+    recent passes (oldest first), best the lowest count seen and elapsed the
+    wall clock seconds spent flocking.
+    """
+
+    TREND_LENGTH = 20
+
+    def __init__(self, reason, passes, trend, best, elapsed):
+        self.reason = reason
+        self.passes = passes
+        self.trend = list(trend[-self.TREND_LENGTH :])
+        self.best = best
+        self.elapsed = elapsed
+        super().__init__(
+            f"rooms failed to separate: {reason} after {passes} passes"
+            f" ({elapsed:.2f}s), best neighbour count {best}, recent {self.trend}"
+        )
+
+    def __reduce__(self):
+        # the default reduce passes the formatted message to __init__, this
+        # keeps the error intact when it is raised in a worker process
+        return (
+            type(self),
+            (self.reason, self.passes, self.trend, self.best, self.elapsed),
+        )
+
+    def todict(self):
+        return dict(
+            reason=self.reason,
+            passes=self.passes,
+            trend=self.trend,
+            best=self.best,
+            elapsed=self.elapsed,
+        )
+
+
 def clip_indices(isegment):
     if isegment == 0:
         return 1, 2, 0
@@ -38,17 +82,59 @@ class Generator:
 
     NAME = "tinykeep"
 
+    # where snapshots go when debug is set and no snapshot_dir is given
+    DEBUG_SNAPSHOT_DIR = "snapshots"
+
     """
     https://www.gamedeveloper.com/programming/procedural-dungeon-generation-algorithm
     """
 
-    def __init__(self, debug=False, allow_crossing=False):
+    def __init__(
+        self,
+        debug=False,
+        allow_crossing=False,
+        vectorized=False,
+        flock_conformance=False,
+        max_flock_passes=None,
+        flock_stall_passes=None,
+        flock_timeout=None,
+        compact=False,
+        snapshot_dir=None,
+    ):
         self.debug = debug
         self.debug_room_graph = False
         self.allow_crossing = allow_crossing
-
-    def _reset_generator(self, gp):
+        self.vectorized = vectorized
+        # run the scalar flocking engine alongside and raise Error if the
+        # results differ
+        self.flock_conformance = flock_conformance
+
+        # flocking budget, None means unlimited. ConvergenceError is raised
+        # when any is exceeded. A stall is a run of passes that fail to
+        # improve on the lowest neighbour count seen so far.
+        self.max_flock_passes = max_flock_passes
+        self.flock_stall_passes = flock_stall_passes
+        self.flock_timeout = flock_timeout
+
+        # neighbour count for each pass of the most recent flocking run
+        self.flock_trend = []
+
+        # keep generated and loaded maps in a MapStore, see compact_model
+        self.compact = compact
+        self.store = None
+
+        # render the model at each named generation stage, see snapshot. off
+        # unless a directory is given or debug is set
+        if snapshot_dir is None and debug:
+            snapshot_dir = self.DEBUG_SNAPSHOT_DIR
+        self.snapshot_dir = snapshot_dir
+        self.snapshot_opts = None
+
+    def _reset_generator(self, gp, rng=None):
         self._generated = False
+        # all random draws come from rng, the map's own random.Random when
+        # generating, so maps can be generated concurrently
+        self.rng = random if rng is None else rng
         self._loaded = False
         self.gp = gp
         self.ag = GenArena(self.gp.arena_size, self.gp.tile_snap_size)
@@ -56,6 +142,8 @@ class Generator:
 
         self.rooms = []
         self.corridors = []
+        # spatial index of self.rooms, built once the rooms are positioned
+        self.room_index = None
 
         # room index tuple -> corridor index
         self.joined_rooms = dict()
@@ -72,24 +160,85 @@ class Generator:
 
     def _position_rooms(self):
 
-        self.rooms = [rand_room(self.ag, self.rg) for i in range(self.gp.rooms)]
+        self.rooms = [rand_room(self.ag, self.rg, rng=self.rng) for i in range(self.gp.rooms)]
 
         min_separation = self.gp.room_szmax * self.gp.min_separation_factor
 
-        boids = [Boid(r) for r in self.rooms]
+        # drawn up front, in room order, so both engines start from the same
+        # rng state
+        angles = [self.rng.uniform(0.0, 2.0 * math.pi) for r in self.rooms]
+
+        if self.flock_conformance:
+            expect_rooms = copy.deepcopy(self.rooms)
+            expect_passes = list(
+                self._converge(
+                    self._flock_scalar(expect_rooms, angles, min_separation)
+                )
+            )
+
+        flock = self._flock_vectorized if self.vectorized else self._flock_scalar
+
+        for neigbouring_last_pass in self._converge(
+            flock(self.rooms, angles, min_separation)
+        ):
+            if self.debug:
+                print(
+                    f"neigbouring last pass: {neigbouring_last_pass}", file=sys.stderr
+                )
+
+            yield neigbouring_last_pass
+
+        if self.flock_conformance:
+            self._check_flock_conformance(
+                expect_rooms, expect_passes, self.flock_trend
+            )
+
+    def _converge(self, passes):
+        """
+        Record the neighbour count trend of a flocking run and enforce the
+        flocking budget, raising ConvergenceError when it is exceeded.
+        """
+        self.flock_trend = trend = []
+        start = time.monotonic()
+        best = None
+        stalled = 0
+
+        for neigbouring_last_pass in passes:
+            trend.append(neigbouring_last_pass)
+            if best is None or neigbouring_last_pass < best:
+                best = neigbouring_last_pass
+                stalled = 0
+            else:
+                stalled += 1
+
+            reason = None
+            elapsed = time.monotonic() - start
+            if self.max_flock_passes is not None and len(trend) >= self.max_flock_passes:
+                reason = "pass limit reached"
+            elif self.flock_stall_passes is not None and stalled >= self.flock_stall_passes:
+                reason = f"no improvement in {stalled} passes"
+            elif self.flock_timeout is not None and elapsed >= self.flock_timeout:
+                reason = "time limit reached"
+            if reason is not None:
+                raise ConvergenceError(reason, len(trend), trend, best, elapsed)
+
+            yield neigbouring_last_pass
+
+    def _flock_scalar(self, rooms, angles, min_separation):
+
+        boids = [Boid(r, angle) for r, angle in zip(rooms, angles)]
+        grid = BoidGrid(boids, min_separation)
 
         while True:
             neigbouring_last_pass = 0
-            for r in boids:
+            for i, r in enumerate(boids):
 
                 neigbours = []
                 nearest_neighbour = None
                 shortest_dist = self.gp.arena_size * 2
 
-                for other in boids:
-                    if r is other:
-                        continue
-
+                for j in grid.candidates(i):
+                    other = boids[j]
                     d = r.euclidean_dist(other)
                     if d > min_separation:
                         continue
@@ -113,17 +262,42 @@ class Generator:
                 # cohesion(r, neigbours)
 
                 r.flock(distance=self.gp.flock_factor)
+                grid.update(i)
 
             if neigbouring_last_pass == 0:
                 break
 
-            if self.debug:
-                print(
-                    f"neigbouring last pass: {neigbouring_last_pass}", file=sys.stderr
-                )
+            yield neigbouring_last_pass
+
+    def _flock_vectorized(self, rooms, angles, min_separation):
+
+        boids = BoidArrays(rooms, angles, min_separation)
+
+        while True:
+            neigbouring_last_pass = boids.flock_pass(
+                self.gp.arena_size * 2,
+                tan_fudge=self.gp.tan_fudge,
+                distance=self.gp.flock_factor,
+            )
+            if neigbouring_last_pass == 0:
+                break
 
             yield neigbouring_last_pass
 
+    def _check_flock_conformance(self, expect_rooms, expect_passes, passes):
+        """raise Error if the flocking engine diverged from the scalar engine"""
+
+        if passes != expect_passes:
+            raise Error(
+                f"flocking conformance: {len(passes)} passes, expected {len(expect_passes)}"
+            )
+        for i, (r, expect) in enumerate(zip(self.rooms, expect_rooms)):
+            if (r.center.x, r.center.y) != (expect.center.x, expect.center.y):
+                raise Error(
+                    f"flocking conformance: room {i} at ({r.center.x}, {r.center.y}),"
+                    f" expected ({expect.center.x}, {expect.center.y})"
+                )
+
     def _mark_main_rooms(self):
 
         w_avg = 0
@@ -173,26 +347,34 @@ class Generator:
         tris = self.delaunay_mesh
         tri_indices = tris.simplices  # has shape (n_triangles, 3)
 
-        imax = 0
-        for tridex in tri_indices:
-            for i in tridex:
-                if i > imax:
-                    imax = i
+        # every triangle edge in the orientation the simplex lists it. edges
+        # are the (row, col) entries of a unidirectional graph, an edge shared
+        # by two triangles may appear in both orientations.
+        edges = np.unique(
+            np.concatenate(
+                (tri_indices[:, [0, 1]], tri_indices[:, [0, 2]], tri_indices[:, [1, 2]])
+            ),
+            axis=0,
+        )
 
-        uni_graph = np.zeros((imax + 1, imax + 1))
+        # checked before the zero length edges are dropped, a self edge has
+        # zero length
+        loops = edges[:, 0] == edges[:, 1]
+        if np.any(loops):
+            raise Error(
+                f"diagonal of unidirectional graph should be all zeros: {edges[loops]}"
+            )
 
-        for tridex in tri_indices:
-            equiv_coord_array = tris.points[tridex]
-            dist_array = scipy.spatial.distance.pdist(equiv_coord_array)
-            uni_graph[tridex[0], tridex[1]] = dist_array[0]
-            uni_graph[tridex[0], tridex[2]] = dist_array[1]
-            uni_graph[tridex[1], tridex[2]] = dist_array[2]
-
-        for e in np.diag(uni_graph):
-            if e != 0.0:
-                raise Error(
-                    f"diagonal of unidirectional graph should be all zeros: {np.diag(uni_graph)}"
-                )
+        # zero length edges are absent, as they would be from a dense matrix
+        delta = tris.points[edges[:, 0]] - tris.points[edges[:, 1]]
+        lengths = np.sqrt(delta[:, 0] * delta[:, 0] + delta[:, 1] * delta[:, 1])
+        edges = edges[lengths != 0.0]
+        lengths = lengths[lengths != 0.0]
+
+        imax = int(tri_indices.max())
+        uni_graph = scipy.sparse.coo_matrix(
+            (lengths, (edges[:, 0], edges[:, 1])), shape=(imax + 1, imax + 1)
+        ).tocsr()
 
         sparse = scipy.sparse.csgraph.minimum_spanning_tree(uni_graph)
         cx = sparse.tocoo()  # convert to coordinate representation of matrix
@@ -249,7 +431,7 @@ class Generator:
 
         k = int(math.ceil(len(excluded_edges) * (self.gp.corridor_redundancy / 100.0)))
 
-        sample = random.sample([edge for edge in excluded_edges], k=k)
+        sample = self.rng.sample([edge for edge in excluded_edges], k=k)
 
         self.main_room_secondary_connections = sample
 
@@ -285,7 +467,7 @@ class Generator:
             cor.join_sides = list(join_sides)
 
             # record the index of any crossed room, allong with the wall and corridor segment
-            cor.crosses = list(rooms_crossing_line(self.rooms, line, i, j))
+            cor.crosses = list(self.room_index.crossing_line(line, i, j))
             if not cor.crosses or self.allow_crossing:
                 return cor, i, j
 
@@ -293,7 +475,7 @@ class Generator:
         ok, line, join_sides = g.box_vextrude(bi, bj, min=vshadow_min)
         if ok:
             cor.points = list(line)
-            cor.crosses = list(rooms_crossing_line(self.rooms, line, i, j))
+            cor.crosses = list(self.room_index.crossing_line(line, i, j))
             cor.join_sides = list(join_sides)
             if not cor.crosses or self.allow_crossing:
                 return cor, i, j
@@ -307,14 +489,14 @@ class Generator:
         (line1, join1), (line2, join2) = g.box_lextrude(bi, bj)
         cor.points = list(line1)
         cor.join_sides = list(join1)
-        cor.crosses = list(rooms_crossing_line(self.rooms, line1, i, j))
+        cor.crosses = list(self.room_index.crossing_line(line1, i, j))
 
         if not cor.crosses:
             return cor, i, j
 
         cor.alternate = list(line2)
         cor.alternate_join_sides = list(join2)
-        cor.alternate_crosses = list(rooms_crossing_line(self.rooms, line2, i, j))
+        cor.alternate_crosses = list(self.room_index.crossing_line(line2, i, j))
 
         # if the alternate does not cross, just promote it
         if not cor.alternate_crosses:
@@ -392,49 +574,61 @@ class Generator:
 
     def _generate_intersections(self):
 
-        gi = GenerateIntersections(self.rooms, self.corridors)
+        gi = GenerateIntersections(self.rooms, self.corridors, self.room_index)
 
         gi.snap_close_corridor_pairs()
 
-        entangled = gi.find_first_entangled_corridor_pair()
+        worklist = gi.entangled_worklist()
+        entangled = worklist.first()
         while entangled:
             ic, jc = entangled
+            worklist.touch(ic, jc)
             ok = gi.generate_corridor_intersection(ic, jc)
             assert ok
-            entangled = gi.find_first_entangled_corridor_pair()
+            worklist.refresh()
+            entangled = worklist.first()
 
         # now look for crossing corridors that leave the same room
-        cx = gi.find_first_crossing_from_same_room()
+        worklist = gi.crossing_worklist()
+        cx = worklist.first()
         while cx:
+            worklist.touch(cx.ic, cx.jc)
             ok = gi.merge_crossing(cx)
             assert ok
-            cx = gi.find_first_crossing_from_same_room()
+            worklist.refresh()
+            cx = worklist.first()
 
     def _generate_corridors(self, map):
 
+        self.room_index = RoomIndex(self.rooms)
+
         self._mark_main_rooms()
         self._main_rooms_delaunay_triangulation()
         self._main_rooms_minimal_spanning_tree()
         self._generate_main_corridors()
 
-        opts = self.create_render_opts(map.args)
         self._generate_secondary_corridors()
 
-        import svgwrite
-
-        dwg = svgwrite.Drawing(filename="x-pre.svg")
-        arena = dwg.add(dwg.g(id="arena", fill="blue"))
-        self.render(dwg, arena, opts=opts)
-        dwg.save(pretty=True)
-
+        if self.snapshot_dir is not None:
+            self.snapshot("pre-intersections")
         self._generate_intersections()
+        if self.snapshot_dir is not None:
+            self.snapshot("post-intersections")
 
     def generate_rooms(self, map):
 
-        self._reset_generator(map.gp)
-        list(self._position_rooms())
+        self._reset_generator(map.gp, map.rng)
+        if self.snapshot_dir is None:
+            list(self._position_rooms())
+            return
+
+        self.snapshot_opts = self.create_render_opts(map.args)
+        for i, _ in enumerate(self._position_rooms()):
+            self.snapshot(f"flock-pass-{i + 1}")
 
     def generate_corridors(self, map):
+        if self.snapshot_dir is not None:
+            self.snapshot_opts = self.create_render_opts(map.args)
         self._generate_corridors(map)
 
     def generate(self, map):
@@ -442,6 +636,21 @@ class Generator:
         self.generate_rooms(map)
         self.generate_corridors(map)
         self._generated = True
+        if self.compact:
+            self.compact_model()
+
+    def compact_model(self):
+        """
+        Move the rooms and corridors into a MapStore.
+
+        self.rooms and self.corridors become read only sequences of views on
+        the store. Only the state that is saved with the map is kept.
+        """
+        self.store = MapStore(self.rooms, self.corridors)
+        self.rooms = self.store.rooms
+        self.corridors = self.store.corridors
+        # the index is only used while generating, and holds the Room objects
+        self.room_index = None
 
     def load_rooms(self, map, model):
         """load the model rooms"""
@@ -460,14 +669,22 @@ class Generator:
     def fromjson(self, map, model):
         """load the model"""
 
-        self._reset_generator(map.gp)
+        self._reset_generator(map.gp, map.rng)
         self.load_rooms(map, model)
         self.load_corridors(map, model)
         self._loaded = True
+        if self.compact:
+            self.compact_model()
 
     def tojson(self, dumps=False):
         """save the generated model to json compatible object tree"""
 
+        if self.store is not None:
+            model = self.store.encode()
+            if not dumps:
+                return model
+            return json.dumps(model, sort_keys=True, indent=2)
+
         rooms = []
         for r in self.rooms:
             rooms.append(r.encode())
@@ -490,9 +707,32 @@ class Generator:
         opts.legend = not args.no_legend
         return opts
 
+    def snapshot(self, stage):
+        """
+        Render the model, as it stands, to <snapshot_dir>/<stage>.svg
+
+        Does nothing when snapshot_dir is None. Generation checks
+        snapshot_dir before calling, so disabled snapshots cost nothing.
+        """
+        if self.snapshot_dir is None:
+            return
+
+        import svgwrite
+
+        os.makedirs(self.snapshot_dir, exist_ok=True)
+        dwg = svgwrite.Drawing(filename=os.path.join(self.snapshot_dir, f"{stage}.svg"))
+        arena = dwg.add(dwg.g(id="arena", fill="blue"))
+        # Viewer.render scales the grid of the opts it is given, in place
+        opts = copy.copy(self.snapshot_opts) if self.snapshot_opts else None
+        self.render(dwg, arena, opts=opts)
+        dwg.save(pretty=True)
+
     def render(self, dwg, arena, opts=None):
 
         # if not (self._generated or self._loaded):
         #     raise Error("you must generate or load a model before rendering")
 
         Viewer(self).render(self.gp, dwg, arena, opts=opts)
+        if self.store is not None:
+            # leave the store as the only copy of a compact model
+            self.store.drop()
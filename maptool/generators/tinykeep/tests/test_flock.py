@@ -0,0 +1,85 @@
+import random
+
+import pytest
+
+from maptool.datatypes import Vec2
+from maptool.room import Room
+from maptool.generators.tinykeep.flock import Boid, BoidArrays, BoidGrid
+
+
+def scattered_boids(n, spread):
+    return [
+        Boid(
+            Room(
+                center=Vec2(random.uniform(-spread, spread), random.uniform(-spread, spread)),
+                width=1.0,
+                length=1.0,
+            )
+        )
+        for _ in range(n)
+    ]
+
+
+def near(boids, i, min_separation):
+    return [
+        j
+        for j, other in enumerate(boids)
+        if j != i and not boids[i].euclidean_dist(other) > min_separation
+    ]
+
+
+@pytest.mark.parametrize("min_separation", [0.0, 1.7, 8.0, 50.0])
+def test_grid_candidates_cover_neighbours(min_separation):
+    random.seed(min_separation)
+    boids = scattered_boids(120, 40.0)
+    # put a pair exactly min_separation apart on a cell boundary
+    boids[1].center.x = boids[0].center.x + min_separation
+    boids[1].center.y = boids[0].center.y
+    grid = BoidGrid(boids, min_separation)
+
+    for i in range(len(boids)):
+        candidates = grid.candidates(i)
+        assert candidates == sorted(candidates)
+        assert set(near(boids, i, min_separation)) <= set(candidates)
+
+
+def test_grid_tracks_moves():
+    random.seed(2)
+    boids = scattered_boids(60, 30.0)
+    grid = BoidGrid(boids, 2.0)
+
+    for _ in range(5):
+        for i, b in enumerate(boids):
+            b.flock(distance=3.0)
+            grid.update(i)
+            assert set(near(boids, i, 2.0)) <= set(grid.candidates(i))
+
+    boids[3].center.x = float("nan")
+    grid.update(3)
+    assert 3 in grid.candidates(0)
+    assert grid.candidates(3) == [j for j in range(len(boids)) if j != 3]
+
+
+def test_arrays_match_boids():
+    random.seed(3)
+    boids = scattered_boids(80, 20.0)
+    rooms = [
+        Room(center=Vec2(b.center.x, b.center.y), width=1.0, length=1.0) for b in boids
+    ]
+    arrays = BoidArrays(rooms, [b.angle for b in boids], 6.0)
+
+    for _ in range(10):
+        expect = 0
+        for b in boids:
+            neighbours = [o for o in boids if o is not b and not b.euclidean_dist(o) > 6.0]
+            if not neighbours:
+                continue
+            expect += len(neighbours)
+            nearest = min(neighbours, key=b.euclidean_dist)
+            b.separation(nearest, min_separation=6.0)
+            b.flock(distance=2.0)
+
+        assert arrays.flock_pass(1000.0, distance=2.0) == expect
+        assert [(r.center.x, r.center.y) for r in rooms] == [
+            (b.center.x, b.center.y) for b in boids
+        ]
@@ -0,0 +1,45 @@
+from maptool.datatypes import Vec2
+from maptool.corridor import Corridor
+from maptool.generators.tinykeep.intersections import GenerateIntersections, side_pairs
+
+
+def test_side_pairs_ordered():
+    assert list(side_pairs({3, 1, 2})) == [
+        (ic, jc) for ic in {3, 1, 2} for jc in {3, 1, 2} if ic != jc
+    ]
+
+
+def test_corridors_entangled_memoised(monkeypatch):
+    ca = Corridor(points=[Vec2(0.0, 0.0), Vec2(10.0, 0.0)], joins=[0, 1])
+    cb = Corridor(points=[Vec2(0.0, 0.0), Vec2(6.0, 0.0), Vec2(6.0, 8.0)], joins=[0, 2])
+    gi = GenerateIntersections([], [ca, cb])
+
+    calls = []
+    check_entangled = Corridor.check_entangled
+
+    def counted(self, co, **kw):
+        calls.append(kw)
+        return check_entangled(self, co, **kw)
+
+    monkeypatch.setattr(Corridor, "check_entangled", counted)
+
+    expect = check_entangled(ca, cb)
+    assert expect
+    assert gi.corridors_entangled(0, 1) == expect
+    assert gi.corridors_entangled(0, 1) == expect
+    assert len(calls) == 1
+
+    # the reverse order and a different margin are separate checks
+    assert gi.corridors_entangled(1, 0) == check_entangled(cb, ca)
+    gi.corridors_entangled(0, 1, margin_factor=0.015)
+    assert len(calls) == 3
+
+    # moving a point invalidates the result once it is recorded
+    cb.points[1].y = cb.points[2].y = 5.0
+    cb.points[0].y = 5.0
+    assert gi.corridors_entangled(0, 1) == expect
+    gi.changed(1)
+    assert not gi.corridors_entangled(0, 1)
+    assert len(calls) == 4
+    assert not gi.corridors_entangled(0, 1)
+    assert len(calls) == 4
@@ -0,0 +1,36 @@
+import random
+
+import numpy as np
+import pytest
+import scipy
+from scipy.spatial import Delaunay
+
+
+def dense_mst_edges(points):
+    """the spanning tree from a dense matrix filled one simplex at a time"""
+    tris = Delaunay(points)
+    n = tris.simplices.max() + 1
+    uni_graph = np.zeros((n, n))
+    for tridex in tris.simplices:
+        dist_array = scipy.spatial.distance.pdist(tris.points[tridex])
+        uni_graph[tridex[0], tridex[1]] = dist_array[0]
+        uni_graph[tridex[0], tridex[2]] = dist_array[1]
+        uni_graph[tridex[1], tridex[2]] = dist_array[2]
+    cx = scipy.sparse.csgraph.minimum_spanning_tree(uni_graph).tocoo()
+    return [(i, j, v) for i, j, v in zip(cx.row, cx.col, cx.data) if v != 0.0]
+
+
+@pytest.mark.parametrize("n,spread", [(4, 10), (30, 12), (300, 10**6)])
+def test_sparse_mst_matches_dense(emptymodel, n, spread):
+    rs = np.random.RandomState(n)
+    points = np.unique(rs.randint(0, spread, size=(n, 2)).astype(float), axis=0)
+
+    g = emptymodel
+    g.delaunay_tri_points = points
+    g.delaunay_room_indices = list(range(len(points)))
+    g.delaunay_mesh = Delaunay(points)
+    random.seed(n)
+    g._main_rooms_minimal_spanning_tree()
+
+    expect = dense_mst_edges(points)
+    assert list(g.main_room_mst_connections) == [(i, j) for i, j, v in expect]
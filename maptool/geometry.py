@@ -6,7 +6,7 @@ line intersection with aabb usies Liang-Barsky. See:
 * https://en.wikipedia.org/wiki/Liang%E2%80%93Barsky_algorithm
 * https://www.jeffreythompson.org/collision-detection
 """
-from typing import Tuple
+from typing import Optional, Tuple
 import sys
 import math
 
@@ -212,6 +212,60 @@ def check_line_line(p1: Vec2, p2: Vec2, p3: Vec2, p4: Vec2) -> bool:
     return False
 
 
+def check_box_hvline(b: Box, p1: Vec2, p2: Vec2) -> Optional[int]:
+    """check_box_line for a horizontal or vertical line
+
+    Only the two box sides perpendicular to the line can be crossed, the
+    parallel sides always fail the check_line_line divisor test. For those two
+    sides this evaluates the check_line_line expressions with the terms that
+    are exactly zero removed, so the result is identical to check_box_line.
+
+    Returns None if the line is not axis aligned or a coordinate is not finite,
+    check_box_line must be used instead.
+    """
+
+    sx = p2.x - p1.x
+    sy = p2.y - p1.y
+    w = b.br.x - b.tl.x
+    h = b.br.y - b.tl.y
+
+    # x - x == 0.0 is False for inf and nan
+    if not (sx - sx == 0.0 and sy - sy == 0.0 and w - w == 0.0 and h - h == 0.0):
+        return None
+
+    if sy == 0.0:
+        # horizontal, check the left then the right side
+        divisor = -(sx * h)
+        if essentially_zero(divisor):
+            return -1
+        ua = sx * (b.tl.y - p1.y) / divisor
+        if ua >= 0.0 and ua <= 1.0:
+            ub = -(h * (b.tl.x - p1.x)) / divisor
+            if ub >= 0.0 and ub <= 1.0:
+                return LEFT
+            ub = -(h * (b.br.x - p1.x)) / divisor
+            if ub >= 0.0 and ub <= 1.0:
+                return RIGHT
+        return -1
+
+    if sx == 0.0:
+        # vertical, check the top then the bottom side
+        divisor = sy * w
+        if essentially_zero(divisor):
+            return -1
+        ua = -(sy * (b.tl.x - p1.x)) / divisor
+        if ua >= 0.0 and ua <= 1.0:
+            ub = w * (b.tl.y - p1.y) / divisor
+            if ub >= 0.0 and ub <= 1.0:
+                return TOP
+            ub = w * (b.br.y - p1.y) / divisor
+            if ub >= 0.0 and ub <= 1.0:
+                return BOTTOM
+        return -1
+
+    return None
+
+
 def check_box_line(b: Box, p1: Vec2, p2: Vec2) -> int:
     """return an integer indicating which box side is intersected by the line or -1 if it doesn't
 
@@ -220,6 +274,10 @@ def check_box_line(b: Box, p1: Vec2, p2: Vec2) -> int:
     top = 0, left =1, bottom=2, right=3
     """
 
+    wall = check_box_hvline(b, p1, p2)
+    if wall is not None:
+        return wall
+
     # top side
     if check_line_line(b.tl, Vec2(b.br.x, b.tl.y), p1, p2):
         return TOP
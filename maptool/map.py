@@ -11,7 +11,7 @@ import importlib
 from pathlib import Path
 import svgwrite
 import vrf.ec
-from vrf.ec import ecvrf_prove, ecvrf_proof_to_hash
+from vrf.ec import ecvrf_prove, ecvrf_proof_to_hash, VrfSigner
 from .clicommon import run_status
 
 def hash512(message):
@@ -71,6 +71,12 @@ class Map:
     default_tan_fudge = 0.0001
     default_tile_snap_size = 4.0
 
+    # flocking budget. not generation parameters, they only decide when to
+    # give up on a map that is failing to generate
+    default_max_flock_passes = 100000
+    default_flock_stall_passes = 20000
+    default_flock_timeout = None
+
     @classmethod
     def defaults_dict(cls):
         return dict(
@@ -91,6 +97,13 @@ class Map:
             secret=None,
             seed=None,
             debug=False,
+            vectorized=False,
+            flock_conformance=False,
+            max_flock_passes=cls.default_max_flock_passes,
+            flock_stall_passes=cls.default_flock_stall_passes,
+            flock_timeout=cls.default_flock_timeout,
+            compact=False,
+            snapshot_dir=None,
             svgfile=None,
             render_generations=-1,
             no_label_rooms=False,
@@ -108,6 +121,9 @@ class Map:
 
     def __init__(self, args):
 
+        # every random draw made generating this map comes from here, the
+        # module level random is never touched. see reseed_rng
+        self.rng = random.Random()
         self.args = args
 
         if self.args is None:
@@ -159,11 +175,17 @@ class Map:
         Only the holder of the secret can prove
         a) they generated the map
         b) what the map generation inputs were
+
+        secret may be the key bytes or a vrf.ec.VrfSigner. Callers committing
+        many maps under the same key should pass a signer so the key derivation
+        is done once.
         """
 
         gpstr = self.canonical_gpstr(gp)
         alpha = self.cannonical_alpha(gpstr, seed)
-        public_key = vrf.ec.get_public_key(secret)
+        if not isinstance(secret, VrfSigner):
+            secret = VrfSigner(secret)
+        public_key = secret.public_key
         p_status, pi = ecvrf_prove(secret, alpha.encode())
         if p_status != "VALID":
             raise SeedError("failed to generate seed and paramaters proof")
@@ -203,9 +225,9 @@ class Map:
 
     def new_proof(self):
 
-        # If the user provided a private key, use it. Otherwise generate one
+        # If the user provided a private key (hex or VrfSigner), use it. Otherwise generate one
         secret = self.args.secret
-        if secret is not None:
+        if isinstance(secret, str):
             secret = bytes.fromhex(secret)
         if secret is None:
             secret = secrets.token_bytes(nbytes=32)
@@ -255,7 +277,7 @@ class Map:
             self._hash_alpha = hash_alpha
         # Note: version=2 means the integer seed uses all the bytes in _beta
         # XXXX: XXXX: this needs to seed on ALPHA! we put beta on the chain
-        random.seed(a=self._hash_alpha, version=2)
+        self.rng.seed(a=self._hash_alpha, version=2)
 
     def generate(self, model="tinykeep"):
 
@@ -266,7 +288,14 @@ class Map:
         try:
             module = f".generators.{model}.model"
             return importlib.import_module(module, __package__).Generator(
-                debug=self.args.debug
+                debug=self.args.debug,
+                vectorized=self.args.vectorized,
+                flock_conformance=self.args.flock_conformance,
+                max_flock_passes=self.args.max_flock_passes,
+                flock_stall_passes=self.args.flock_stall_passes,
+                flock_timeout=self.args.flock_timeout,
+                compact=self.args.compact,
+                snapshot_dir=self.args.snapshot_dir,
             )
         except ImportError:
             raise Error(
@@ -355,6 +384,69 @@ def run_generate(args):
     return 0
 
 
+def vrf_inputs_from_record(record: dict) -> dict:
+    """Normalise a stored commitment to the vrf_inputs layout
+
+    Accepts either saved map vrf_inputs (alpha plus a proof dict) or the flat
+    public_key, alpha, beta, pi layout returned by the service"""
+    if "vrf_inputs" in record:
+        record = record["vrf_inputs"]
+    proof = record.get("proof", record)
+    return dict(
+        alpha=record["alpha"],
+        proof=dict(
+            public_key=proof["public_key"], pi=proof["pi"], beta=proof["beta"]
+        ),
+    )
+
+
+def verify_vrf_inputs(records) -> list:
+    """Verify many stored commitments at once, returns a bool per record
+
+    A record is valid if the proof verifies for the public key and alpha *and*
+    the resulting hash is the recorded beta."""
+    items = []
+    for vrf_inputs in records:
+        proof = vrf_inputs["proof"]
+        items.append(
+            (
+                bytes.fromhex(proof["public_key"]),
+                bytes.fromhex(proof["pi"]),
+                vrf_inputs["alpha"].encode(),
+            )
+        )
+    results = vrf.ec.ecvrf_verify_batch(items)
+    return [
+        status == "VALID" and beta.hex() == vrf_inputs["proof"]["beta"]
+        for (status, beta), vrf_inputs in zip(results, records)
+    ]
+
+
+def run_verify(args):
+    """Verify map commitments"""
+
+    records = []
+    if args.loadfile:
+        with open(args.loadfile, "r") as f:
+            records.append(vrf_inputs_from_record(json.load(f)))
+
+    if args.batch:
+        with open(args.batch, "r") as f:
+            for line in f:
+                if line.strip():
+                    records.append(vrf_inputs_from_record(json.loads(line)))
+
+    if not records:
+        raise Error("nothing to verify, provide --batch or --loadfile")
+
+    ok = verify_vrf_inputs(records)
+    for i, valid in enumerate(ok):
+        if not valid:
+            print(f"INVALID: {i} {records[i]['alpha']}")
+    print(f"verified {len(ok)}, invalid {ok.count(False)}")
+    return 0 if all(ok) else 1
+
+
 def run(args=None):
     if args is None:
         args = sys.argv[1:]
@@ -412,11 +504,65 @@ def run(args=None):
     p.add_argument("--savefile", default=None)
     p.add_argument("--render-generations", type=int, default=-1)
     p.add_argument("--svgfile", default=None)
-    p.add_argument("--debug", action="store_true")
+    p.add_argument(
+        "--debug",
+        action="store_true",
+        help="trace flocking and write generation snapshots, see --snapshot-dir",
+    )
+    p.add_argument(
+        "--snapshot-dir",
+        default=None,
+        help="render the map to this directory at each generation stage"
+        " (pre-intersections, post-intersections and each flocking pass)."
+        " --debug alone uses ./snapshots",
+    )
+    p.add_argument(
+        "--vectorized",
+        action="store_true",
+        help="use the numpy flocking engine to position the rooms",
+    )
+    p.add_argument(
+        "--flock-conformance",
+        action="store_true",
+        help="also run the scalar flocking engine and fail if the results differ",
+    )
+    p.add_argument(
+        "--max-flock-passes",
+        type=int,
+        default=g_defaults.max_flock_passes,
+        help="give up if the rooms have not separated after this many passes",
+    )
+    p.add_argument(
+        "--flock-stall-passes",
+        type=int,
+        default=g_defaults.flock_stall_passes,
+        help="give up if this many passes fail to improve the separation",
+    )
+    p.add_argument(
+        "--flock-timeout",
+        type=float,
+        default=g_defaults.flock_timeout,
+        help="give up if the rooms have not separated after this many seconds",
+    )
+    p.add_argument(
+        "--compact",
+        action="store_true",
+        help="hold the generated map in compact array storage",
+    )
     p.add_argument("--no-label-rooms", action="store_true")
     p.add_argument("--no-label-corridors", action="store_true")
     p.add_argument("--no-legend", action="store_true")
 
+    p = subcmd.add_parser("verify", help=run_verify.__doc__)
+    p.set_defaults(func=run_verify)
+    p.add_argument(
+        "--batch",
+        default=None,
+        help="""file with one json commitment per line. either saved map
+    vrf_inputs or the public_key, alpha, beta, pi returned by the service""",
+    )
+    p.add_argument("--loadfile", default=None, help="verify a saved map")
+
     args = top.parse_args(args)
     return args.func(args)
 
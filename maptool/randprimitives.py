@@ -1,4 +1,8 @@
-"""generate various random primitives"""
+"""generate various random primitives
+
+Each function draws from rng, the module level random by default. Pass a
+random.Random to keep generation independent of the global random state.
+"""
 
 import math
 import random
@@ -16,43 +20,43 @@ def round(n: float, m: float):
     return math.floor(((n + m - 1.0)) / m) * m
 
 
-def rand_cointoss(bias=0.5) -> bool:
-    return random.random() > bias
+def rand_cointoss(bias=0.5, rng=random) -> bool:
+    return rng.random() > bias
 
 
-def rand_point_in_circle(radius: float, tile_snap_size: float) -> Vec2:
+def rand_point_in_circle(radius: float, tile_snap_size: float, rng=random) -> Vec2:
     """Generate a point at a random position within a circle"""
 
-    t = 2.0 * math.pi * random.random()
-    u = random.random() + random.random()
+    t = 2.0 * math.pi * rng.random()
+    u = rng.random() + rng.random()
     r = 2.0 - u if u > 1.0 else u
     x = radius * r * math.cos(t)
     y = radius * r * math.sin(t)
     return Vec2(round(x, tile_snap_size), round(y, tile_snap_size))
 
 
-def rand_box(s1: float, s2: float, ratio: float, snap: float):
+def rand_box(s1: float, s2: float, ratio: float, snap: float, rng=random):
 
-    if rand_cointoss():
+    if rand_cointoss(rng=rng):
         w1, w2 = s1, s2
         l1, l2 = s1 * ratio, s2 * ratio
     else:
         l1, l2 = s1, s2
         w1, w2 = s1 * ratio, s2 * ratio
 
-    w = round(random.uniform(w1, w2), snap * 2)
-    l = round(random.uniform(l1, l2), snap * 2)
+    w = round(rng.uniform(w1, w2), snap * 2)
+    l = round(rng.uniform(l1, l2), snap * 2)
     tl = Vec2(-w / 2, -l / 2)
     br = Vec2(w / 2, l / 2)
     return Box(tl, br)
 
 
-def rand_split_box(box):
+def rand_split_box(box, rng=random):
     """split box supports bsp based generation"""
 
-    splitfactor = random.random()
+    splitfactor = rng.random()
 
-    if rand_cointoss():
+    if rand_cointoss(rng=rng):
         # split vertical axis
 
         # tl
@@ -91,17 +95,17 @@ def rand_split_box(box):
     return left, right
 
 
-def rand_room(ag: GenArena, rg: GenRoom) -> Room:
+def rand_room(ag: GenArena, rg: GenRoom, rng=random) -> Room:
 
-    c = rand_point_in_circle(ag.arena_size, ag.tile_snap_size)
+    c = rand_point_in_circle(ag.arena_size, ag.tile_snap_size, rng=rng)
 
-    if rand_cointoss():
+    if rand_cointoss(rng=rng):
         w1, w2 = rg.s1, rg.s2
         l1, l2 = rg.s1 * rg.ratio, rg.s2 * rg.ratio
     else:
         l1, l2 = rg.s1, rg.s2
         w1, w2 = rg.s1 * rg.ratio, rg.s2 * rg.ratio
 
-    w = round(random.uniform(w1, w2), ag.tile_snap_size)
-    l = round(random.uniform(l1, l2), ag.tile_snap_size)
+    w = round(rng.uniform(w1, w2), ag.tile_snap_size)
+    l = round(rng.uniform(l1, l2), ag.tile_snap_size)
     return Room(center=c, width=w, length=l)
@@ -1,3 +1,4 @@
+import math
 from typing import List
 from dataclasses import dataclass, field
 from .datatypes import Vec2, Box, GenSpace
@@ -228,6 +229,113 @@ def rooms_crossing_line(rooms, line, *ignore):
                 yield (i, wall, j)
 
 
+class RoomIndex:
+    """
+    Uniform grid over the room boxes, for finding the rooms a corridor crosses
+
+    Each room is filed in every cell its box overlaps, so a segment need only
+    be checked against the rooms in the cells its own bounding box covers.
+    The room boxes are padded a little when filed so that crossings exactly on
+    a wall are never missed. Rooms whose boxes are not finite can't be filed,
+    they are checked for every segment.
+
+    The room boxes are captured when the room is added. If a room moves, call
+    update for it.
+    """
+
+    PADDING = 1e-6
+
+    def __init__(self, rooms, cell_size=None):
+        self.rooms = rooms
+
+        if cell_size is None:
+            sizes = [max(r.width, r.length) for r in rooms]
+            cell_size = sum(sizes) / len(sizes) if sizes else 0.0
+        if not cell_size > 0.0 or math.isinf(cell_size):
+            cell_size = 1.0
+        self.cell_size = cell_size
+
+        self.boxes = []
+        self.cells = {}
+        self.unfiled = set()
+        self.filed = []
+        for i in range(len(rooms)):
+            self.add(i)
+
+    def _cell_range(self, minx, miny, maxx, maxy):
+        pad = self.cell_size * self.PADDING
+        try:
+            return (
+                math.floor((minx - pad) / self.cell_size),
+                math.floor((miny - pad) / self.cell_size),
+                math.floor((maxx + pad) / self.cell_size),
+                math.floor((maxy + pad) / self.cell_size),
+            )
+        except (ValueError, OverflowError):
+            return None
+
+    def add(self, i):
+        """file rooms[i], which must be the next room not yet in the index"""
+        assert i == len(self.boxes)
+        self.boxes.append(None)
+        self.filed.append(None)
+        self.update(i)
+
+    def update(self, i):
+        """re-file rooms[i] after it has moved or changed size"""
+
+        for key in self.filed[i] or ():
+            self.cells[key].discard(i)
+        self.unfiled.discard(i)
+
+        r = self.rooms[i]
+        box = self.boxes[i] = Box(r.topleft(), r.bottomright())
+        span = self._cell_range(box.tl.x, box.tl.y, box.br.x, box.br.y)
+        if span is None:
+            self.filed[i] = None
+            self.unfiled.add(i)
+            return
+
+        x0, y0, x1, y1 = span
+        keys = self.filed[i] = [
+            (x, y) for x in range(x0, x1 + 1) for y in range(y0, y1 + 1)
+        ]
+        for key in keys:
+            self.cells.setdefault(key, set()).add(i)
+
+    def candidates(self, line):
+        """indices, ascending, of the rooms that may be crossed by line"""
+
+        found = set(self.unfiled)
+        for j in range(len(line) - 1):
+            p1, p2 = line[j], line[j + 1]
+            span = self._cell_range(
+                min(p1.x, p2.x), min(p1.y, p2.y), max(p1.x, p2.x), max(p1.y, p2.y)
+            )
+            if span is None:
+                return range(len(self.rooms))
+            x0, y0, x1, y1 = span
+            for x in range(x0, x1 + 1):
+                for y in range(y0, y1 + 1):
+                    found.update(self.cells.get((x, y), ()))
+        return sorted(found)
+
+    def crossing_line(self, line, *ignore):
+        """as rooms_crossing_line, yields (room, wall, segment) for each crossing"""
+
+        for i in self.candidates(line):
+
+            if i in ignore:
+                continue
+
+            room_box = self.boxes[i]
+            for j in range(len(line) - 1):
+                p1, p2 = line[j], line[j + 1]
+                wall = g.check_box_line(room_box, p1, p2)
+                if wall != -1:
+                    yield (i, wall, j)
+
+
 def rooms_bbox(rooms) -> Box:
 
     minx, miny = None, None
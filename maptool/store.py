@@ -0,0 +1,298 @@
+"""compact, array backed, storage for generated maps
+
+A generated map holds a Room per room and a Corridor per corridor, each with
+its own Vec2 points and lists. MapStore keeps the same state in a handful of
+numpy arrays. Views, with __slots__, present the stored rooms and corridors
+through the Room and Corridor API so existing code can read a compacted map
+unchanged. The views are for reading, changes to them are not stored.
+
+Only the state that survives encoding is kept. Generation time bookkeeping,
+such as corridor crossings and entanglements, reads as its empty default.
+"""
+from collections import namedtuple
+from collections.abc import Sequence
+
+import numpy as np
+
+from .datatypes import Error, Vec2
+from .room import Room
+from .corridor import Corridor
+
+MAIN = 1
+INTERSECTION = 2
+
+# stored in place of a None join or join side
+NO_JOIN = -1
+
+
+class Vec2View(namedtuple("Vec2View", "x y")):
+    """a stored Vec2, read only"""
+
+    __slots__ = ()
+
+    def clone(self):
+        return Vec2(self.x, self.y)
+
+    def __eq__(self, other):
+        if not isinstance(other, (Vec2, Vec2View)):
+            return NotImplemented
+        return (self.x, self.y) == (other.x, other.y)
+
+    def __ne__(self, other):
+        eq = self.__eq__(other)
+        return eq if eq is NotImplemented else not eq
+
+    __hash__ = tuple.__hash__
+
+
+class RoomView:
+    """a stored room, read through the Room API"""
+
+    __slots__ = (
+        "center",
+        "width",
+        "length",
+        "is_main",
+        "is_intersection",
+        "corridors",
+    )
+
+    def __init__(self, center, width, length, flags, corridors):
+        self.center = center
+        self.width = width
+        self.length = length
+        self.is_main = bool(flags & MAIN)
+        self.is_intersection = bool(flags & INTERSECTION)
+        # the corridor indices on each side, as tuples
+        self.corridors = corridors
+
+    @classmethod
+    def all(cls, store):
+        centers = store.room_centers.tolist()
+        sizes = store.room_sizes.tolist()
+        flags = store.room_flags.tolist()
+        flat = store.room_corridors.tolist()
+        offsets = store.room_corridor_offsets.tolist()
+        return [
+            cls(
+                Vec2View(*centers[i]),
+                sizes[i][0],
+                sizes[i][1],
+                flags[i],
+                tuple(
+                    tuple(flat[offsets[side] : offsets[side + 1]])
+                    for side in range(i * 4, i * 4 + 4)
+                ),
+            )
+            for i in range(len(centers))
+        ]
+
+    def encode(self):
+        return dict(
+            x=self.center.x,
+            y=self.center.y,
+            w=self.width,
+            l=self.length,
+            inter=self.is_intersection,
+            main=self.is_main,
+            corridors=[list(side) for side in self.corridors],
+        )
+
+    topleft = Room.topleft
+    bottomright = Room.bottomright
+    pt_left = Room.pt_left
+    pt_right = Room.pt_right
+    pt_top = Room.pt_top
+    pt_bottom = Room.pt_bottom
+    euclidean_dist = Room.euclidean_dist
+    attached_side = Room.attached_side
+    corridor_side = Room.corridor_side
+
+
+class CorridorView:
+    """a stored corridor, read through the Corridor API"""
+
+    __slots__ = ("points", "joins", "join_sides")
+
+    # not stored, see the module docs
+    alternate = ()
+    alternate_join_sides = ()
+    crosses = ()
+    alternate_crosses = ()
+    clipped = 0
+    is_inserted = False
+    entangled = ()
+
+    def __init__(self, points, joins, join_sides):
+        self.points = points
+        self.joins = joins
+        self.join_sides = join_sides
+
+    @classmethod
+    def all(cls, store):
+        points = [Vec2View(*p) for p in store.corridor_points.tolist()]
+        offsets = store.corridor_offsets.tolist()
+        joins = store.corridor_joins.tolist()
+        join_sides = store.corridor_join_sides.tolist()
+        return [
+            cls(
+                points[offsets[i] : offsets[i + 1]],
+                [_from_stored(j) for j in joins[i]],
+                [_from_stored(s) for s in join_sides[i]],
+            )
+            for i in range(len(joins))
+        ]
+
+    def encode(self):
+        return dict(
+            points=[(p.x, p.y) for p in self.points],
+            joins=self.joins,
+            join_sides=self.join_sides,
+        )
+
+    check_entangled = Corridor.check_entangled
+    check_crossing = Corridor.check_crossing
+
+
+class Views(Sequence):
+    """
+    The rooms or corridors of a MapStore as a sequence of views.
+
+    The views are built from the arrays, all at once, on first access and
+    kept until drop is called. Reads then cost about what they do on Room
+    and Corridor objects, but while they are held the views take memory of
+    the same order as the objects they stand in for. The tinykeep model
+    encodes from short lived views and drops the views once it has rendered.
+    """
+
+    __slots__ = ("_store", "_view", "_len", "_views")
+
+    def __init__(self, store, view, n):
+        self._store = store
+        self._view = view
+        self._len = n
+        self._views = None
+
+    def _all(self):
+        views = self._views
+        if views is None:
+            views = self._views = self._view.all(self._store)
+        return views
+
+    def drop(self):
+        """release the views, leaving only the arrays"""
+        self._views = None
+
+    def __len__(self):
+        return self._len
+
+    def __getitem__(self, i):
+        return self._all()[i]
+
+    def __iter__(self):
+        return iter(self._all())
+
+
+def _to_stored(v):
+    return NO_JOIN if v is None else v
+
+
+def _from_stored(v):
+    return None if v == NO_JOIN else v
+
+
+class MapStore:
+    """
+    Columnar storage for the rooms and corridors of a map.
+
+    Rooms: room_centers and room_sizes are (n, 2) float64, room_flags holds
+    the MAIN and INTERSECTION bits. The corridor indices attached to each room
+    side are concatenated in room_corridors, the indices for side s of room i
+    are room_corridors[room_corridor_offsets[i * 4 + s]:room_corridor_offsets[i * 4 + s + 1]]
+
+    Corridors: the points of every corridor are concatenated in the (m, 2)
+    corridor_points array, corridor i has the points from corridor_offsets[i]
+    to corridor_offsets[i + 1]. corridor_joins and corridor_join_sides are
+    (k, 2) with NO_JOIN standing in for None.
+    """
+
+    def __init__(self, rooms, corridors):
+
+        self.room_centers = np.array(
+            [(r.center.x, r.center.y) for r in rooms], dtype=np.float64
+        ).reshape(len(rooms), 2)
+        self.room_sizes = np.array(
+            [(r.width, r.length) for r in rooms], dtype=np.float64
+        ).reshape(len(rooms), 2)
+        self.room_flags = np.array(
+            [
+                (MAIN if r.is_main else 0) | (INTERSECTION if r.is_intersection else 0)
+                for r in rooms
+            ],
+            dtype=np.uint8,
+        )
+        sides = [side for r in rooms for side in r.corridors]
+        if len(sides) != len(rooms) * 4:
+            raise Error("every room must have a corridor list for each of its 4 sides")
+        self.room_corridors = np.array(
+            [icor for side in sides for icor in side], dtype=np.int32
+        )
+        self.room_corridor_offsets = np.cumsum(
+            [0] + [len(side) for side in sides], dtype=np.int64
+        )
+
+        for i, c in enumerate(corridors):
+            if len(c.joins) != 2 or len(c.join_sides) != 2:
+                raise Error(f"corridor {i} must join exactly two rooms")
+        self.corridor_points = np.array(
+            [(p.x, p.y) for c in corridors for p in c.points], dtype=np.float64
+        ).reshape(-1, 2)
+        self.corridor_offsets = np.cumsum(
+            [0] + [len(c.points) for c in corridors], dtype=np.int64
+        )
+        self.corridor_joins = np.array(
+            [[_to_stored(j) for j in c.joins] for c in corridors], dtype=np.int32
+        ).reshape(len(corridors), 2)
+        self.corridor_join_sides = np.array(
+            [[_to_stored(s) for s in c.join_sides] for c in corridors], dtype=np.int8
+        ).reshape(len(corridors), 2)
+
+        self.rooms = Views(self, RoomView, len(rooms))
+        self.corridors = Views(self, CorridorView, len(corridors))
+
+    @classmethod
+    def from_encoding(cls, model):
+        """create a store from the encoded rooms and corridors of a map model"""
+        return cls(
+            [Room.from_encoding(r) for r in model["rooms"]],
+            [Corridor.from_encoding(c) for c in model["corridors"]],
+        )
+
+    def drop(self):
+        """release the room and corridor views, leaving only the arrays"""
+        self.rooms.drop()
+        self.corridors.drop()
+
+    def encode(self):
+        # from short lived views, encoding does not keep the views around
+        return dict(
+            rooms=[r.encode() for r in RoomView.all(self)],
+            corridors=[c.encode() for c in CorridorView.all(self)],
+        )
+
+    def nbytes(self) -> int:
+        """the size of the stored arrays"""
+        return sum(
+            a.nbytes
+            for a in (
+                self.room_centers,
+                self.room_sizes,
+                self.room_flags,
+                self.room_corridors,
+                self.room_corridor_offsets,
+                self.corridor_points,
+                self.corridor_offsets,
+                self.corridor_joins,
+                self.corridor_join_sides,
+            )
+        )
@@ -1,10 +1,22 @@
 import pytest
 import secrets
 import json
+import pickle
+import gc
+import tracemalloc
+import random
+from types import SimpleNamespace
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
 from .map import Map
-from .map import run
+from .map import run, verify_vrf_inputs
 from .randprimitives import rand_box, rand_split_box
 from .geometry import *
+from .generators.tinykeep.model import ConvergenceError, Error, Generator
+from .generators.tinykeep.intersections import GenerateIntersections
+from vrf.ec import VrfSigner
 
 
 def test_generator_init_noargs():
@@ -45,31 +57,33 @@ def test_generator_vrf_inputs():
     assert "seed" not in r
 
 
+REGRESSION_SEEDS = [
+    (
+        "regression-demo-map",
+        "9c9d1793f1e2c6db",
+        "b6eb87339ec3b87f70308f471e02b544325e88f30bd56e8bf9ff530cb1223325",
+    ),
+    (
+        "regression-clip-indirectly-disentangles",
+        b"K\x92\xa1o\xa6\xff\xc4\x0c".hex(),
+        b"\x11\x19)~\xcc]\\5\x94\xfe\x92\xea\x0e\xca \x85\xbbd^\x9b\xf7GN\xcc\\\xa7u3\xc3q)k".hex(),
+    ),
+    (
+        "regression-2",
+        "e7357c72ae6861ae",
+        "a23cccec37055701674748316860eac927212048f0666ea02ef0bf1737e2195e",
+    ),
+    (
+        "regression-3",
+        "49febb61d5f15e9e",
+        "a80a2426333f59f9b585d8e6698d01163f959dbd196d44d43d35b4ce699646d0",
+    ),
+]
+
+
 @pytest.mark.parametrize(
     "note,seed,secret",
-    [
-        (
-            "regression-demo-map",
-            "9c9d1793f1e2c6db",
-            "b6eb87339ec3b87f70308f471e02b544325e88f30bd56e8bf9ff530cb1223325",
-        ),
-        (
-            "regression-clip-indirectly-disentangles",
-            b"K\x92\xa1o\xa6\xff\xc4\x0c".hex(),
-            b"\x11\x19)~\xcc]\\5\x94\xfe\x92\xea\x0e\xca \x85\xbbd^\x9b\xf7GN\xcc\\\xa7u3\xc3q)k".hex(),
-        ),
-        (
-            "regression-2",
-            "e7357c72ae6861ae",
-            "a23cccec37055701674748316860eac927212048f0666ea02ef0bf1737e2195e",
-        ),
-        (
-            "regression-3",
-            "49febb61d5f15e9e",
-            "a80a2426333f59f9b585d8e6698d01163f959dbd196d44d43d35b4ce699646d0",
-        ),
-        ("random", None, None),
-    ],
+    REGRESSION_SEEDS + [("random", None, None)],
 )
 def test_generator_deterministic(note, seed, secret):
 
@@ -212,3 +226,261 @@ def test_generator_persist():
 def test_run():
     status = run(args=["gen", "--svgfile", "x.svg"])
     assert status == 0
+
+
+def test_verify_batch(tmp_path):
+
+    records = []
+    for i in range(3):
+        args = Map.defaults()
+        args.secret = secrets.token_bytes(nbytes=32).hex()
+        args.seed = secrets.token_bytes(nbytes=8).hex()
+        records.append(Map.from_args(args).vrf_inputs(format=None))
+
+    # one in the flat layout returned by the service /commit/ endpoint
+    flat = dict(alpha=records[2]["alpha"], **records[2]["proof"])
+
+    batch = tmp_path / "commitments.jsonl"
+    batch.write_text("\n".join(json.dumps(r) for r in records[:2] + [flat]))
+    assert run(args=["verify", "--batch", str(batch)]) == 0
+
+    tampered = dict(records[1], proof=dict(records[1]["proof"], beta=records[0]["proof"]["beta"]))
+    assert verify_vrf_inputs([records[0], tampered]) == [True, False]
+
+    batch.write_text(json.dumps(tampered))
+    assert run(args=["verify", "--batch", str(batch)]) == 1
+
+
+def test_commitment_with_signer():
+
+    secret = secrets.token_bytes(nbytes=32)
+    seed = secrets.token_bytes(nbytes=8)
+    signer = VrfSigner(secret)
+    gp = dict(rooms=16)
+    g = Map(None)
+    assert g.make_commitment(gp, seed, signer) == g.make_commitment(gp, seed, secret)
+
+    args = Map.defaults()
+    args.secret = signer
+    args.seed = seed.hex()
+    v = Map.from_args(args).vrf_inputs(format=None)
+    assert v["proof"]["public_key"] == signer.public_key.hex()
+    assert "secret" not in v
+
+
+@pytest.mark.parametrize("note,seed,secret", REGRESSION_SEEDS)
+def test_vectorized_flock_conformance(note, seed, secret):
+
+    args = Map.defaults()
+    args.gp_model = "tinykeep"
+    args.seed = seed
+    args.secret = secret
+
+    g = Map.from_args(args)
+    g.generate()
+    expect = g.model.tojson(dumps=True)
+
+    args.vectorized = True
+    args.flock_conformance = True
+    g = Map.from_args(args)
+    g.generate()
+    assert g.model.tojson(dumps=True) == expect
+
+
+@pytest.mark.parametrize(
+    "budget,reason",
+    [
+        (dict(max_flock_passes=50), "pass limit reached"),
+        (dict(flock_stall_passes=10), "no improvement in 10 passes"),
+        (dict(flock_timeout=0.0), "time limit reached"),
+    ],
+)
+def test_flock_budget(budget, reason):
+
+    note, seed, secret = REGRESSION_SEEDS[0]
+    args = Map.defaults()
+    args.gp_model = "tinykeep"
+    args.gp_flock_factor = 1.0
+    args.seed = seed
+    args.secret = secret
+    for k, v in budget.items():
+        setattr(args, k, v)
+
+    g = Map.from_args(args)
+    with pytest.raises(ConvergenceError) as exc:
+        g.generate()
+    assert exc.value.reason == reason
+    assert exc.value.passes == len(g.model.flock_trend)
+    assert exc.value.trend == g.model.flock_trend[-ConvergenceError.TREND_LENGTH :]
+    assert exc.value.best == min(g.model.flock_trend)
+
+    # the service raises it from worker processes
+    assert pickle.loads(pickle.dumps(exc.value)).todict() == exc.value.todict()
+
+
+def test_spanning_tree_rejects_self_edges():
+
+    # a simplex repeating a vertex gives a zero length self edge
+    points = np.array([[0.0, 0.0], [1.0, 0.0], [0.0, 1.0]])
+    model = SimpleNamespace(
+        delaunay_tri_points=points,
+        delaunay_mesh=SimpleNamespace(points=points, simplices=np.array([[0, 0, 1]])),
+    )
+    with pytest.raises(Error, match="diagonal"):
+        Generator._main_rooms_minimal_spanning_tree(model)
+
+
+def test_compact():
+
+    note, seed, secret = REGRESSION_SEEDS[0]
+    args = Map.defaults()
+    args.gp_model = "tinykeep"
+    args.seed = seed
+    args.secret = secret
+
+    g = Map.from_args(args)
+    g.generate()
+    expect = g.tojson(dumps=False)
+
+    args.compact = True
+    g = Map.from_args(args)
+    g.generate()
+    assert g.model.store is not None
+    assert g.tojson(dumps=False) == expect
+    assert g.render(None)
+
+    loaded = Map(args)
+    loaded.load_model(loaded.load_common(json.dumps(expect)))
+    assert loaded.model.store is not None
+    assert loaded.tojson(dumps=False)["model"] == expect["model"]
+
+
+def test_compact_retains_less():
+
+    note, seed, secret = REGRESSION_SEEDS[0]
+
+    def retained(compact):
+        args = Map.defaults()
+        args.gp_model = "tinykeep"
+        args.gp_rooms = 60
+        args.seed = seed
+        args.secret = secret
+        args.compact = compact
+
+        gc.collect()
+        tracemalloc.start()
+        try:
+            g = Map.from_args(args)
+            g.generate()
+            g.tojson()
+            g.render(None)
+            gc.collect()
+            return tracemalloc.get_traced_memory()[0]
+        finally:
+            tracemalloc.stop()
+
+    # the first maps fill caches that outlive them
+    retained(False)
+    retained(True)
+
+    # generation state and the views made to encode and render are released,
+    # the store is the only copy of the rooms and corridors
+    assert retained(True) < retained(False) / 2
+
+
+def test_concurrent_generation():
+
+    def generate(seed, secret):
+        args = Map.defaults()
+        args.gp_model = "tinykeep"
+        args.seed = seed
+        args.secret = secret
+        g = Map.from_args(args)
+        g.generate()
+        return g.tojson(dumps=True)
+
+    state = random.getstate()
+    expect = [generate(seed, secret) for note, seed, secret in REGRESSION_SEEDS]
+    assert random.getstate() == state
+
+    with ThreadPoolExecutor(max_workers=len(REGRESSION_SEEDS)) as pool:
+        futures = [
+            pool.submit(generate, seed, secret)
+            for _ in range(3)
+            for note, seed, secret in REGRESSION_SEEDS
+        ]
+    assert [f.result() for f in futures] == expect * 3
+
+
+def test_snapshots(tmp_path, monkeypatch):
+
+    note, seed, secret = REGRESSION_SEEDS[0]
+    args = Map.defaults()
+    args.gp_model = "tinykeep"
+    args.seed = seed
+    args.secret = secret
+
+    # off by default, nothing is written anywhere
+    monkeypatch.chdir(tmp_path)
+    g = Map.from_args(args)
+    g.generate()
+    expect = g.tojson(dumps=False)
+    assert list(tmp_path.iterdir()) == []
+
+    args.snapshot_dir = str(tmp_path / "stages")
+    g = Map.from_args(args)
+    g.generate()
+    assert g.tojson(dumps=False) == expect
+
+    written = sorted(p.name for p in (tmp_path / "stages").iterdir())
+    passes = [f"flock-pass-{i + 1}.svg" for i in range(len(g.model.flock_trend))]
+    assert written == sorted(["pre-intersections.svg", "post-intersections.svg"] + passes)
+
+    args.snapshot_dir = None
+    args.debug = True
+    g = Map.from_args(args)
+    g.generate()
+    assert (tmp_path / Generator.DEBUG_SNAPSHOT_DIR / "post-intersections.svg").exists()
+
+
+@pytest.mark.parametrize("note,seed,secret", REGRESSION_SEEDS)
+def test_intersection_worklists(monkeypatch, note, seed, secret):
+    """the worklists must find the same fix as a full rescan at every step"""
+
+    def checked_intersections(self):
+        gi = GenerateIntersections(self.rooms, self.corridors, self.room_index)
+        gi.snap_close_corridor_pairs()
+
+        worklist = gi.entangled_worklist()
+        while True:
+            entangled = gi.find_first_entangled_corridor_pair()
+            assert worklist.first() == entangled
+            if not entangled:
+                break
+            worklist.touch(*entangled)
+            gi.generate_corridor_intersection(*entangled)
+            worklist.refresh()
+
+        worklist = gi.crossing_worklist()
+        while True:
+            cx = gi.find_first_crossing_from_same_room()
+            assert worklist.first() == cx
+            if not cx:
+                break
+            worklist.touch(cx.ic, cx.jc)
+            gi.merge_crossing(cx)
+            worklist.refresh()
+
+    args = Map.defaults()
+    args.gp_model = "tinykeep"
+    args.seed = seed
+    args.secret = secret
+
+    g = Map.from_args(args)
+    g.generate()
+    expect = g.tojson(dumps=False)
+
+    monkeypatch.setattr(Generator, "_generate_intersections", checked_intersections)
+    g = Map.from_args(args)
+    g.generate()
+    assert g.tojson(dumps=False) == expect
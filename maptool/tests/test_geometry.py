@@ -248,3 +248,46 @@ def test_box_haligned():
 
     assert not box_valigned(b1, b2)
     assert not box_valigned(b2, b1)
+
+
+def check_box_line_generic(b, p1, p2):
+    for wall, (e1, e2) in enumerate(
+        [
+            (b.tl, Vec2(b.br.x, b.tl.y)),
+            (b.tl, Vec2(b.tl.x, b.br.y)),
+            (Vec2(b.tl.x, b.br.y), b.br),
+            (Vec2(b.br.x, b.tl.y), Vec2(b.br.x, b.br.y)),
+        ]
+    ):
+        if check_line_line(e1, e2, p1, p2):
+            return wall
+    return -1
+
+
+def test_check_box_hvline_matches_generic():
+    import random
+
+    random.seed(16)
+    # small integer grids so segments often end on, or run along, the walls
+    for spread, scale in [(8, 1.0), (8, 0.1), (1000, 0.37)]:
+        boxes = []
+        for _ in range(40):
+            x, y = random.randint(0, spread) * scale, random.randint(0, spread) * scale
+            w, h = random.randint(0, 4) * scale, random.randint(0, 4) * scale
+            boxes.append(Box(Vec2(x, y), Vec2(x + w, y + h)))
+
+        for _ in range(300):
+            p1 = Vec2(random.randint(0, spread) * scale, random.randint(0, spread) * scale)
+            d = random.randint(-spread, spread) * scale
+            p2 = Vec2(p1.x + d, p1.y) if random.random() < 0.5 else Vec2(p1.x, p1.y + d)
+
+            expect = [check_box_line_generic(b, p1, p2) for b in boxes]
+            assert [check_box_hvline(b, p1, p2) for b in boxes] == expect
+            assert [check_box_line(b, p1, p2) for b in boxes] == expect
+
+
+def test_check_box_hvline_not_applicable():
+    b = Box(Vec2(0.0, 0.0), Vec2(4.0, 4.0))
+    assert check_box_hvline(b, Vec2(-1.0, -1.0), Vec2(5.0, 5.0)) is None
+    assert check_box_line(b, Vec2(-1.0, -1.0), Vec2(5.0, 5.0)) != -1
+    assert check_box_hvline(b, Vec2(-1.0, 2.0), Vec2(float("inf"), 2.0)) is None
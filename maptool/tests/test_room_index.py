@@ -0,0 +1,63 @@
+import random
+
+import pytest
+
+from maptool.datatypes import Vec2
+from maptool.room import Room, RoomIndex, rooms_crossing_line
+
+
+def scattered_rooms(n, spread=200.0):
+    return [
+        Room(
+            center=Vec2(random.uniform(0, spread), random.uniform(0, spread)),
+            width=random.choice([4.0, 8.0, 20.0]),
+            length=random.choice([4.0, 8.0, 20.0]),
+        )
+        for _ in range(n)
+    ]
+
+
+def random_line(spread=200.0):
+    """axis aligned corridor of two or three points"""
+    p1 = Vec2(random.uniform(0, spread), random.uniform(0, spread))
+    p2 = Vec2(random.uniform(0, spread), p1.y)
+    if random.random() < 0.5:
+        return [p1, p2]
+    return [p1, p2, Vec2(p2.x, random.uniform(0, spread))]
+
+
+@pytest.mark.parametrize("cell_size", [None, 1.0, 50.0, 1000.0])
+def test_crossing_line_matches_exhaustive(cell_size):
+    random.seed(cell_size)
+    rooms = scattered_rooms(60)
+    index = RoomIndex(rooms, cell_size=cell_size)
+
+    for _ in range(200):
+        line = random_line()
+        assert list(index.crossing_line(line, 0, 1)) == list(
+            rooms_crossing_line(rooms, line, 0, 1)
+        )
+
+
+def test_crossing_line_on_wall():
+    rooms = [Room(center=Vec2(10.0, 10.0), width=8.0, length=8.0)]
+    index = RoomIndex(rooms, cell_size=14.0)
+    # runs along the bottom wall then leaves from the bottom right corner
+    line = [Vec2(0.0, 14.0), Vec2(14.0, 14.0), Vec2(14.0, 30.0)]
+    assert list(index.crossing_line(line)) == list(rooms_crossing_line(rooms, line))
+    assert list(index.crossing_line(line))
+
+
+def test_add_and_update():
+    random.seed(1)
+    rooms = scattered_rooms(20)
+    index = RoomIndex(rooms)
+
+    rooms.append(Room(center=Vec2(500.0, 500.0), width=10.0, length=10.0))
+    index.add(len(rooms) - 1)
+    line = [Vec2(480.0, 500.0), Vec2(520.0, 500.0)]
+    assert [c[0] for c in index.crossing_line(line)] == [len(rooms) - 1]
+
+    rooms[-1].center = Vec2(900.0, 900.0)
+    index.update(len(rooms) - 1)
+    assert not list(index.crossing_line(line))
@@ -0,0 +1,73 @@
+from ..datatypes import Vec2
+from ..room import Room, RoomSide
+from ..corridor import Corridor
+from ..store import MapStore
+
+
+def small_map():
+    rooms = [
+        Room(center=Vec2(10.0, 10.0), width=8.0, length=6.0, is_main=True),
+        Room(center=Vec2(40.0, 12.5), width=4.0, length=4.0),
+        Room(center=Vec2(40.0, 30.0), is_intersection=True),
+    ]
+    corridors = [
+        Corridor(
+            points=[Vec2(14.0, 10.0), Vec2(38.0, 10.0)],
+            joins=[0, 1],
+            join_sides=[RoomSide.EAST, RoomSide.WEST],
+        ),
+        Corridor(
+            points=[Vec2(10.0, 13.0), Vec2(10.0, 30.0), Vec2(40.0, 30.0)],
+            joins=[0, 2],
+            join_sides=[RoomSide.SOUTH, RoomSide.WEST],
+        ),
+    ]
+    rooms[0].corridors[RoomSide.EAST].append(0)
+    rooms[0].corridors[RoomSide.SOUTH].append(1)
+    rooms[1].corridors[RoomSide.WEST].append(0)
+    rooms[2].corridors[RoomSide.WEST].append(1)
+    return rooms, corridors
+
+
+def test_store_views():
+    rooms, corridors = small_map()
+    store = MapStore(rooms, corridors)
+
+    assert len(store.rooms) == 3
+    assert len(store.corridors) == 2
+    for r, v in zip(rooms, store.rooms):
+        assert v.center == r.center
+        assert (v.width, v.length) == (r.width, r.length)
+        assert (v.is_main, v.is_intersection) == (r.is_main, r.is_intersection)
+        assert [list(side) for side in v.corridors] == r.corridors
+        assert v.topleft() == r.topleft()
+        assert v.pt_bottom() == r.pt_bottom()
+        assert v.encode() == r.encode()
+
+    assert store.rooms[-1].attached_side(1) == RoomSide.WEST
+    assert store.corridors[1].points[1] == Vec2(10.0, 30.0)
+    assert store.corridors[1].check_crossing(store.corridors[0]) is None
+    assert not store.corridors[0].crosses
+
+    # views are built once and kept until dropped
+    assert store.rooms[0] is store.rooms[0]
+    assert store.corridors[1].points[1] is store.corridors[1].points[1]
+    store.rooms.drop()
+    assert store.rooms[0].encode() == rooms[0].encode()
+    assert [v.encode() for v in store.rooms[1:]] == [r.encode() for r in rooms[1:]]
+
+    room, corridor = store.rooms[0], store.corridors[0]
+    store.drop()
+    assert store.rooms[0] is not room
+    assert store.corridors[0] is not corridor
+
+
+def test_store_encoding():
+    rooms, corridors = small_map()
+    model = dict(
+        rooms=[r.encode() for r in rooms], corridors=[c.encode() for c in corridors]
+    )
+
+    store = MapStore.from_encoding(model)
+    assert store.encode() == model
+    assert store.nbytes() < 500
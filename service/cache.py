@@ -0,0 +1,257 @@
+"""content addressed cache of generated maps
+
+A map is a pure function of its vrf alpha string, so generated maps are
+cached on sha256(version + alpha). The version is a digest of the generator
+source and the versions of the libraries it depends on, a code or dependency
+change never serves maps made by older code.
+
+Each alpha can have several cached variants, eg. the model json and the
+rendered svg with and without a legend. Entries are strings, sized by their
+length (json and svg are ascii) plus a fixed entry_bytes for the key and
+bookkeeping, so caches of short, or empty, values stay bounded too. The in
+memory cache evicts least recently used entries once max_bytes is exceeded. When a directory is given, entries
+are also written there and survive restarts and evictions from memory. Once
+the directory holds more than max_disk_bytes, the entries least recently
+read from or written to it are removed until it is down to 3/4 of that. The
+async
+get_async and put_async do the directory reads and writes in a thread, for
+use from the event loop.
+
+SingleFlight coalesces concurrent misses, so a burst of requests for a map
+that is not cached yet generates it once.
+"""
+import os
+import asyncio
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from pathlib import Path
+from typing import Optional
+
+import numpy
+import scipy
+import svgwrite
+
+import maptool
+import vrf
+
+# the packages whose source decides the generated map
+VERSIONED_PACKAGES = (maptool, vrf)
+# the libraries whose version may change it, eg. the Delaunay triangulation
+VERSIONED_LIBRARIES = (numpy, scipy, svgwrite)
+
+
+@lru_cache(maxsize=None)
+def code_version() -> str:
+    """sha256 over the python source of the generator, tests excluded, and its library versions"""
+    h = hashlib.sha256()
+    for library in VERSIONED_LIBRARIES:
+        h.update(f"{library.__name__}=={library.__version__}\0".encode())
+    for package in VERSIONED_PACKAGES:
+        # vrf is a namespace package, without __file__
+        root = Path(list(package.__path__)[0])
+        for path in sorted(root.rglob("*.py")):
+            rel = path.relative_to(root)
+            name = path.name
+            if "tests" in rel.parts or name.startswith("test_") or name.endswith("_test.py"):
+                continue
+            h.update(f"{package.__name__}/{rel.as_posix()}\0".encode())
+            h.update(path.read_bytes())
+    return h.hexdigest()
+
+
+class MapCache:
+    """LRU cache of map variants keyed on alpha, with an optional directory store"""
+
+    def __init__(
+            self, max_bytes: int, directory=None, version: str = None,
+            entry_bytes: int = 0, max_disk_bytes: Optional[int] = None):
+        self.max_bytes = max_bytes
+        self.entry_bytes = entry_bytes
+        self.max_disk_bytes = max_disk_bytes
+        # bytes in the directory, counted on the first write
+        self.disk_bytes = None
+        self.directory = None if directory is None else Path(directory)
+        self.version = code_version() if version is None else version
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk_lock = threading.Lock()
+
+    def key(self, alpha: str, variant: str) -> str:
+        digest = hashlib.sha256(f"{self.version}\0{alpha}".encode()).hexdigest()
+        return f"{digest}.{variant}"
+
+    def _path(self, key: str) -> Path:
+        return self.directory / key[:2] / key
+
+    def _lookup(self, key: str) -> Optional[str]:
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+        return value
+
+    def _read(self, key: str) -> Optional[str]:
+        """the entry from the directory, or None. counts the hit or miss"""
+        value = None
+        if self.directory is not None:
+            path = self._path(key)
+            try:
+                value = path.read_text(encoding="utf-8")
+                # mark it recently used, see _prune
+                path.touch()
+            except FileNotFoundError:
+                # absent, or pruned while we read it
+                value = None
+            else:
+                self._remember(key, value)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def _write(self, key: str, value: str):
+        # write then rename so concurrent readers never see a partial entry
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(value)
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+        if self.max_disk_bytes is not None:
+            self._account(len(value))
+
+    def _account(self, size: int):
+        with self._disk_lock:
+            if self.disk_bytes is None:
+                self.disk_bytes = sum(entry[1] for entry in self._scan())
+            else:
+                self.disk_bytes += size
+            if self.disk_bytes > self.max_disk_bytes:
+                self._prune()
+
+    def _scan(self) -> list:
+        """(mtime, size, path) for each entry in the directory"""
+        entries = []
+        for path in self.directory.glob("*/*"):
+            if path.name.startswith(".tmp-"):
+                continue
+            try:
+                st = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+        return entries
+
+    def _prune(self):
+        """remove the least recently used entries until the directory is down to 3/4 of max_disk_bytes"""
+        entries = sorted(self._scan())
+        total = sum(entry[1] for entry in entries)
+        target = self.max_disk_bytes * 3 // 4
+        for _, size, path in entries:
+            if total <= target:
+                break
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+            total -= size
+        self.disk_bytes = total
+
+    def cached(self, alpha: str, variant: str) -> Optional[str]:
+        """the variant for alpha if it is held in memory, or None. never reads the directory"""
+        return self._lookup(self.key(alpha, variant))
+
+    def get(self, alpha: str, variant: str) -> Optional[str]:
+        """the cached variant for alpha, or None"""
+        key = self.key(alpha, variant)
+        value = self._lookup(key)
+        if value is None:
+            value = self._read(key)
+        return value
+
+    async def get_async(self, alpha: str, variant: str) -> Optional[str]:
+        """get, reading the directory in a thread"""
+        key = self.key(alpha, variant)
+        value = self._lookup(key)
+        if value is not None:
+            return value
+        if self.directory is None:
+            return self._read(key)
+        return await asyncio.to_thread(self._read, key)
+
+    def put(self, alpha: str, variant: str, value: str):
+        key = self.key(alpha, variant)
+        self._remember(key, value)
+        if self.directory is not None:
+            self._write(key, value)
+
+    async def put_async(self, alpha: str, variant: str, value: str):
+        """put, writing the directory in a thread"""
+        key = self.key(alpha, variant)
+        self._remember(key, value)
+        if self.directory is not None:
+            await asyncio.to_thread(self._write, key, value)
+
+    def _size(self, value: str) -> int:
+        return self.entry_bytes + len(value)
+
+    def _remember(self, key: str, value: str):
+        size = self._size(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.nbytes -= self._size(old)
+            self._entries[key] = value
+            self.nbytes += size
+            while self.nbytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.nbytes -= self._size(evicted)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SingleFlight:
+    """
+    Run at most one call per key at a time, concurrent callers share it.
+
+    The first caller for a key starts the call. Callers arriving while it is
+    in flight wait on the same task and get its result or exception. The
+    task is shielded, a caller giving up doesn't cancel it for the others.
+    """
+
+    def __init__(self):
+        self.calls = {}
+
+    async def run(self, key, fn, *args):
+        """await fn(*args), or the call already in flight for key"""
+        task = self.calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn(*args))
+            self.calls[key] = task
+            task.add_done_callback(lambda t: self._done(key, t))
+        return await asyncio.shield(task)
+
+    def _done(self, key, task):
+        del self.calls[key]
+        # mark the exception retrieved, every caller may have gone
+        if not task.cancelled():
+            task.exception()
+
+    def __len__(self):
+        return len(self.calls)
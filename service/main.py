@@ -1,14 +1,48 @@
+import os
+import re
+import json
+import asyncio
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from enum import Enum
+from functools import lru_cache
 
 import uvicorn
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 
-from starlette.responses import Response
+from starlette.responses import JSONResponse, Response
 
 from pydantic import BaseModel, Field
 
 from maptool.map import Map, hash256
+from maptool.generators.tinykeep.model import ConvergenceError
+from vrf.ec import VrfSigner, ecvrf_verify
+
+from service.cache import MapCache, SingleFlight
+
+# seconds a single map may spend separating its rooms before the request is
+# failed. parameter sets that can't settle must not tie up a worker
+FLOCK_TIMEOUT = float(os.environ.get("MAPTOOL_FLOCK_TIMEOUT", "30"))
+
+# generation and proving run in a pool of worker processes so the event loop
+# stays free for other requests. 0 workers means one per cpu. requests beyond
+# MAX_PENDING (queued + running) are refused with 429, 0 means 4 per worker
+WORKERS = int(os.environ.get("MAPTOOL_WORKERS", "0")) or os.cpu_count() or 1
+MAX_PENDING = int(os.environ.get("MAPTOOL_MAX_PENDING", "0")) or WORKERS * 4
+
+# generated maps are cached on their alpha, see service.cache. the in memory
+# cache holds up to CACHE_BYTES, CACHE_DIR optionally adds a persistent store
+# of up to CACHE_DIR_BYTES
+CACHE_BYTES = int(os.environ.get("MAPTOOL_CACHE_BYTES", str(64 * 1024 * 1024)))
+CACHE_DIR = os.environ.get("MAPTOOL_CACHE_DIR") or None
+CACHE_DIR_BYTES = int(os.environ.get("MAPTOOL_CACHE_DIR_BYTES", str(1024 * 1024 * 1024)))
+# verification results are memoised per (public_key, alpha, pi), each entry
+# is the proven beta, at most 128 hex digits, or "" for a failed proof. it is
+# charged VERIFY_ENTRY_BYTES more for its key and bookkeeping
+VERIFY_CACHE_BYTES = int(os.environ.get("MAPTOOL_VERIFY_CACHE_BYTES", str(1024 * 1024)))
+VERIFY_ENTRY_BYTES = 256
 
 class ModelName(str, Enum):
     tinykeep = "tinykeep"
@@ -25,7 +59,8 @@ class GeneratorInputs(BaseModel):
         default=600.0,
         description="""
             controls how keen are the rooms to spread out. to small and the map
-            will fail to generate"""
+            will fail to generate, /generate/ then responds 422 with the
+            separation progress made"""
     )
     main_room_thresh: float = Field(
         default = 0.8,
@@ -58,12 +93,20 @@ class GeneratorInputs(BaseModel):
         default = 4.0,
         description = """the room width and height are snapped to grid units of this size""")
 
+SECRET_HEX = re.compile("[0-9a-fA-F]{64}")
+SEED_HEX = re.compile("(?:[0-9a-fA-F]{2})+")
+
 class ProofRequest(BaseModel):
     gp: GeneratorInputs
     seed: str = Field(
         default=None,
         description="""random seed to combine with gp to grow the map. if not
         provided, it is generated randomly and returned""")
+    secret: str = Field(
+        default=None,
+        description="""hex private key to commit with. if not provided, a new
+        key is generated and returned. re-using a key lets the service re-use
+        the derived public key across commits""")
 
 class ProofResponse(BaseModel):
     gp: GeneratorInputs
@@ -82,6 +125,12 @@ class GenerateRequest(BaseModel):
     pi: str
 
 
+class VerifyResponse(BaseModel):
+    valid: bool
+    message: str = Field(
+        default=None, description="why the commitment is not valid")
+
+
 class XmlResponse(Response):
     media_type = "text/xthml"
     def render(self, content) -> bytes:
@@ -104,10 +153,207 @@ app.add_middleware(
     allow_headers=["*"]
 )
 
+@lru_cache(maxsize=128)
+def signer(secret: str) -> VrfSigner:
+    """Keyed VRF signers, so repeated commits with the same secret skip the key derivation"""
+    return VrfSigner(bytes.fromhex(secret))
+
 @app.get("/")
 async def root():
     return {"message": "The Root"}
 
+class WorkerPool:
+    """
+    A ProcessPoolExecutor with a bound on the work it will accept.
+
+    pending counts the jobs submitted and not yet finished. run raises
+    HTTPException 429 rather than queue more than max_pending. The pool is
+    started on first use and replaced if a worker process dies.
+    """
+
+    def __init__(self, workers: int, max_pending: int):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.pending = 0
+        self.executor = None
+        self._lock = threading.Lock()
+
+    def _done(self, future):
+        with self._lock:
+            self.pending -= 1
+
+    async def run(self, fn, *args):
+        """run fn(*args) in a worker process and return the result"""
+        with self._lock:
+            if self.pending >= self.max_pending:
+                raise HTTPException(
+                    status_code=429,
+                    detail=f"{self.pending} maps in progress, try again later",
+                    headers={"Retry-After": "1"})
+            if self.executor is None:
+                self.executor = ProcessPoolExecutor(max_workers=self.workers)
+            executor = self.executor
+            try:
+                future = executor.submit(fn, *args)
+            except BrokenProcessPool:
+                # a worker died with no job of ours in it, retry on a fresh pool
+                self._drop(executor)
+                executor = self.executor = ProcessPoolExecutor(max_workers=self.workers)
+                future = executor.submit(fn, *args)
+            self.pending += 1
+        future.add_done_callback(self._done)
+
+        try:
+            return await asyncio.wrap_future(future)
+        except BrokenProcessPool:
+            with self._lock:
+                self._drop(executor)
+            raise HTTPException(
+                status_code=503, detail="map worker failed, try again later")
+
+    def _drop(self, executor):
+        """stop using a broken executor, called with the lock held"""
+        if self.executor is executor:
+            self.executor = None
+        executor.shutdown(wait=False)
+
+    def shutdown(self):
+        with self._lock:
+            executor, self.executor = self.executor, None
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+
+pool = WorkerPool(WORKERS, MAX_PENDING)
+
+
+@app.on_event("shutdown")
+def shutdown_pool():
+    pool.shutdown()
+
+
+def commit_map(gp: dict, seed: str, secret: str) -> dict:
+    """make the vrf commitment for gp. runs in a worker process"""
+
+    args = type('args', (), dict([('gp_' + k, v) for k, v in gp.items()]))
+    args.seed = seed
+    args.secret = None
+    if secret is not None:
+        args.secret = signer(secret)
+
+    map = Map.from_args(args)
+    return map.vrf_inputs(format=None)
+
+
+cache = MapCache(CACHE_BYTES, CACHE_DIR, max_disk_bytes=CACHE_DIR_BYTES)
+
+# in progress generations, keyed on alpha. one generation fills every variant
+generating = SingleFlight()
+
+# the cached variants of each map
+MAP_VARIANTS = ("json", "svg", "svg-legend")
+
+
+def map_variant(svg: bool, svg_legend: bool) -> str:
+    """the cache variant name for a /generate/ response"""
+    if not svg:
+        return "json"
+    return "svg-legend" if svg_legend else "svg"
+
+
+def generate_map(vrf_inputs: dict) -> dict:
+    """
+    generate the map committed to by vrf_inputs. runs in a worker process
+
+    Returns every variant of the map, see MAP_VARIANTS, rendered from the one
+    generation. The json is for Map.tojson without the vrf_inputs, which
+    differ between requests for the same alpha. See map_json_response
+    """
+
+    args = Map.defaults()
+    args.flock_timeout = FLOCK_TIMEOUT
+
+    map = Map(args)
+    map.set_vrf_inputs(vrf_inputs)
+    map.generate()
+
+    variants = dict(
+        json=json.dumps(dict(model_type=map.model.NAME, model=map.model.tojson())))
+    # the render options are read from args on each render
+    args.no_legend = True
+    variants["svg"] = map.render(None)
+    args.no_legend = False
+    variants["svg-legend"] = map.render(None)
+    return variants
+
+
+async def generate_cached(vrf_inputs: dict) -> dict:
+    """
+    every variant of the map, from the cache directory or generated in the
+    worker pool and cached. see generating
+    """
+    alpha = vrf_inputs["alpha"]
+    variants = dict()
+    for variant in MAP_VARIANTS:
+        variants[variant] = await cache.get_async(alpha, variant)
+    if None not in variants.values():
+        return variants
+
+    variants = await pool.run(generate_map, vrf_inputs)
+    for variant in MAP_VARIANTS:
+        await cache.put_async(alpha, variant, variants[variant])
+    return variants
+
+
+# proven betas keyed on the commitment, "" when the proof does not verify
+verified = MapCache(VERIFY_CACHE_BYTES, entry_bytes=VERIFY_ENTRY_BYTES)
+verifying = SingleFlight()
+
+
+def verify_proof(public_key: str, alpha: str, pi: str) -> str:
+    """the beta proven by pi, or "" if it does not verify. runs in a worker process"""
+    try:
+        status, beta = ecvrf_verify(
+            bytes.fromhex(public_key), bytes.fromhex(pi), alpha.encode())
+    except ValueError:
+        return ""
+    if status != "VALID":
+        return ""
+    return beta.hex()
+
+
+async def verify_cached(commitment: str, public_key: str, alpha: str, pi: str) -> str:
+    """verify in the worker pool and remember the result, see verifying"""
+    beta = await pool.run(verify_proof, public_key, alpha, pi)
+    verified.put(commitment, "beta", beta)
+    return beta
+
+
+async def verify_commitment(req: GenerateRequest) -> VerifyResponse:
+    """check pi proves beta for the public key and alpha"""
+
+    public_key, pi = req.public_key.lower(), req.pi.lower()
+    commitment = "\0".join((public_key, req.alpha, pi))
+    beta = verified.get(commitment, "beta")
+    if beta is None:
+        beta = await verifying.run(
+            commitment, verify_cached, commitment, public_key, req.alpha, pi)
+
+    if not beta:
+        return VerifyResponse(
+            valid=False, message="pi is not a proof for the public_key and alpha")
+    if beta != req.beta.lower():
+        return VerifyResponse(valid=False, message="beta is not the hash proven by pi")
+    return VerifyResponse(valid=True)
+
+
+def map_json_response(vrf_inputs: dict, model_json: str) -> Response:
+    """the Map.tojson layout, spliced from the request vrf_inputs and the cached model"""
+    return Response(
+        content=f'{{"vrf_inputs": {json.dumps(vrf_inputs)}, {model_json[1:]}',
+        media_type=JSONResponse.media_type)
+
+
 @app.post("/commit/", response_model=ProofResponse)
 async def commit(req: ProofRequest):
 
@@ -116,27 +362,40 @@ async def commit(req: ProofRequest):
     if req.gp.room_szmax == 0:
         req.gp.room_szmax = req.gp.arena_size / 2.0
 
-    args = type('args', (), dict([('gp_' + k, v) for k, v in req.gp.dict().items()]))
-    args.seed = req.seed
-    args.secret = None
+    if req.secret is not None and not SECRET_HEX.fullmatch(req.secret):
+        raise HTTPException(
+            status_code=422, detail="secret must be 64 hex digits, a 32 byte private key")
+    if req.seed is not None and not SEED_HEX.fullmatch(req.seed):
+        raise HTTPException(status_code=422, detail="seed must be hex encoded bytes")
 
-    map = Map.from_args(args)
-    vrf_inputs = map.vrf_inputs(format=None)
+    vrf_inputs = await pool.run(commit_map, req.gp.dict(), req.seed, req.secret)
     res = ProofResponse(
         gp = req.gp,
-        seed = vrf_inputs['seed'],
+        seed = vrf_inputs.get('seed', req.seed),
         alpha = vrf_inputs['alpha'],
         hash_alpha = f"sha256:0x{hash256(vrf_inputs['alpha'].encode()).hex()}",
         pi = vrf_inputs['proof']['pi'],
         beta = vrf_inputs['proof']['beta'],
-        secret = vrf_inputs['secret'],
+        secret = vrf_inputs.get('secret', req.secret),
         public_key = vrf_inputs['proof']['public_key']
     )
 
     return res
 
+@app.post("/verify/", response_model=VerifyResponse, response_model_exclude_none=True)
+async def verify(req: GenerateRequest):
+    return await verify_commitment(req)
+
 @app.post("/generate/")
-async def generate(req: GenerateRequest, svg: bool = False, svg_legend: bool = False):
+async def generate(
+        req: GenerateRequest, svg: bool = False, svg_legend: bool = False,
+        verify: bool = False):
+
+    if verify:
+        verification = await verify_commitment(req)
+        if not verification.valid:
+            raise HTTPException(
+                status_code=422, detail=dict(message=verification.message))
 
     vrf_inputs = dict(
         public_key = req.public_key,
@@ -147,15 +406,21 @@ async def generate(req: GenerateRequest, svg: bool = False, svg_legend: bool = F
         )
     )
 
-    args = Map.defaults()
-    args.no_legend = not svg_legend
+    variant = map_variant(svg, svg_legend)
+    # only the in memory cache here, the directory is read by generate_cached
+    # so that a burst of misses reads it once
+    result = cache.cached(req.alpha, variant)
+    if result is None:
+        try:
+            variants = await generating.run(req.alpha, generate_cached, vrf_inputs)
+            result = variants[variant]
+        except ConvergenceError as exc:
+            raise HTTPException(
+                status_code=422, detail=dict(message=str(exc), **exc.todict()))
 
-    map = Map(args)
-    map.set_vrf_inputs(vrf_inputs)
-    map.generate()
     if not svg:
-        return map.tojson(dumps=False)
-    return XmlResponse(map.render(None))
+        return map_json_response(vrf_inputs, result)
+    return XmlResponse(result)
 
 @app.get("/defaults")
 async def defaults():
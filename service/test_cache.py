@@ -0,0 +1,154 @@
+import os
+import asyncio
+
+import scipy
+
+from .cache import MapCache, SingleFlight, code_version
+
+
+def test_lru_eviction():
+
+    cache = MapCache(max_bytes=10, version="v1")
+    cache.put("a", "json", "aaaa")
+    cache.put("b", "json", "bbbb")
+    assert cache.get("a", "json") == "aaaa"
+
+    # b is now the least recently used
+    cache.put("c", "json", "cccc")
+    assert cache.get("b", "json") is None
+    assert cache.get("a", "json") == "aaaa"
+    assert cache.get("c", "json") == "cccc"
+    assert cache.nbytes == 8
+    assert (cache.hits, cache.misses) == (3, 1)
+
+    # too big to hold, and never evicts what is there
+    cache.put("d", "json", "d" * 11)
+    assert cache.get("d", "json") is None
+    assert len(cache) == 2
+
+
+def test_entry_bytes():
+
+    # empty values still cost their entry, the cache stays bounded
+    cache = MapCache(max_bytes=1000, version="v1", entry_bytes=100)
+    for i in range(1000):
+        cache.put(str(i), "beta", "")
+    assert len(cache) == 10
+    assert cache.nbytes == 1000
+    assert cache.get("999", "beta") == ""
+    assert cache.get("0", "beta") is None
+
+    cache.put("a", "beta", "b" * 50)
+    assert len(cache) == 9
+    assert cache.nbytes == 950
+
+
+def test_variants_and_versions():
+
+    cache = MapCache(max_bytes=100, version="v1")
+    cache.put("a", "json", "{}")
+    cache.put("a", "svg", "<svg/>")
+    assert cache.get("a", "json") == "{}"
+    assert cache.get("a", "svg") == "<svg/>"
+    assert cache.key("a", "json") != MapCache(100, version="v2").key("a", "json")
+
+
+def test_directory_store(tmp_path):
+
+    cache = MapCache(max_bytes=4, directory=tmp_path, version="v1")
+    cache.put("a", "json", "aaaa")
+    cache.put("b", "json", "bbbb")
+    assert len(cache) == 1
+
+    # evicted from memory, read back from the directory
+    assert cache.get("a", "json") == "aaaa"
+
+    restarted = MapCache(max_bytes=4, directory=tmp_path, version="v1")
+    assert restarted.get("b", "json") == "bbbb"
+    assert MapCache(4, directory=tmp_path, version="v2").get("b", "json") is None
+
+
+def test_directory_store_bound(tmp_path):
+
+    cache = MapCache(max_bytes=4, directory=tmp_path, version="v1", max_disk_bytes=12)
+    for i, alpha in enumerate("abc"):
+        cache.put(alpha, "json", alpha * 4)
+        os.utime(cache._path(cache.key(alpha, "json")), (1000 + i, 1000 + i))
+    assert cache.disk_bytes == 12
+
+    # reading a back from the directory makes it the most recently used
+    assert cache.get("a", "json") == "aaaa"
+
+    # over the bound, pruned to 3/4 of it, least recently used first
+    cache.put("d", "json", "dddd")
+    assert cache.disk_bytes == 8
+    assert [cache.get(alpha, "json") for alpha in "abcd"] == ["aaaa", None, None, "dddd"]
+
+    # a restart counts what is already there
+    restarted = MapCache(4, directory=tmp_path, version="v1", max_disk_bytes=12)
+    restarted.put("e", "json", "eeee")
+    assert restarted.disk_bytes == 12
+
+
+def test_directory_store_async(tmp_path):
+
+    async def main():
+        cache = MapCache(max_bytes=4, directory=tmp_path, version="v1")
+        await cache.put_async("a", "json", "aaaa")
+        await cache.put_async("b", "json", "bbbb")
+        assert cache.cached("a", "json") is None
+        assert await cache.get_async("a", "json") == "aaaa"
+        assert cache.cached("a", "json") == "aaaa"
+        assert await cache.get_async("c", "json") is None
+        assert (cache.hits, cache.misses) == (2, 1)
+
+    asyncio.run(main())
+    assert MapCache(4, directory=tmp_path, version="v1").get("b", "json") == "bbbb"
+
+
+def test_code_version(monkeypatch):
+    assert code_version() == code_version()
+    assert len(code_version()) == 64
+
+    # a dependency upgrade must not serve maps built with the old one
+    version = code_version()
+    monkeypatch.setattr(scipy, "__version__", scipy.__version__ + ".post1")
+    code_version.cache_clear()
+    try:
+        assert code_version() != version
+    finally:
+        monkeypatch.undo()
+        code_version.cache_clear()
+    assert code_version() == version
+
+
+def test_single_flight():
+
+    calls = []
+
+    async def work(x):
+        calls.append(x)
+        await asyncio.sleep(0.01)
+        if x < 0:
+            raise ValueError(x)
+        return x * 2
+
+    async def main():
+        flight = SingleFlight()
+        results = await asyncio.gather(
+            *[flight.run("a", work, 1) for _ in range(5)], flight.run("b", work, 2)
+        )
+        assert results == [2] * 5 + [4]
+        assert calls == [1, 2]
+        assert len(flight) == 0
+
+        # a finished call is not remembered
+        assert await flight.run("a", work, 3) == 6
+
+        failed = await asyncio.gather(
+            *[flight.run("c", work, -1) for _ in range(3)], return_exceptions=True
+        )
+        assert all(isinstance(e, ValueError) for e in failed)
+        assert calls == [1, 2, 3, -1]
+
+    asyncio.run(main())
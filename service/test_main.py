@@ -0,0 +1,277 @@
+import os
+import json
+import time
+import asyncio
+import secrets
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+
+from maptool.map import Map
+from maptool.generators.tinykeep.model import ConvergenceError
+
+from . import main
+from .cache import MapCache
+from .main import MAP_VARIANTS, GenerateRequest, WorkerPool, app, generate_map, verify_proof
+
+
+# jobs for the WorkerPool tests, module level so the workers can unpickle them
+
+def sleep_job(seconds):
+    time.sleep(seconds)
+    return seconds
+
+
+def failing_job():
+    raise ConvergenceError("pass limit reached", 3, [2, 1], 1, 0.1)
+
+
+def dying_job():
+    os._exit(1)
+
+
+def test_worker_pool_backpressure():
+
+    async def main():
+        pool = WorkerPool(workers=1, max_pending=1)
+        try:
+            running = asyncio.ensure_future(pool.run(sleep_job, 0.5))
+            await asyncio.sleep(0.05)
+            assert pool.pending == 1
+
+            with pytest.raises(HTTPException) as exc:
+                await pool.run(sleep_job, 0)
+            assert exc.value.status_code == 429
+            assert exc.value.headers == {"Retry-After": "1"}
+            assert pool.pending == 1
+
+            assert await running == 0.5
+            assert pool.pending == 0
+            assert await pool.run(sleep_job, 0) == 0
+        finally:
+            pool.shutdown()
+
+    asyncio.run(main())
+
+
+def test_worker_pool_releases_pending():
+
+    async def main():
+        pool = WorkerPool(workers=1, max_pending=4)
+        try:
+            with pytest.raises(ConvergenceError) as exc:
+                await pool.run(failing_job)
+            assert exc.value.passes == 3
+            assert pool.pending == 0
+
+            # besides the job a worker is running, the executor moves up to
+            # two more to its call queue early. only the fourth job is
+            # certain to still be queued, cancelling it frees its slot
+            # straight away
+            running = [
+                asyncio.ensure_future(pool.run(sleep_job, 0.2)) for _ in range(3)
+            ]
+            queued = asyncio.ensure_future(pool.run(sleep_job, 0.2))
+            await asyncio.sleep(0.05)
+            assert pool.pending == 4
+            queued.cancel()
+            await asyncio.sleep(0.05)
+            assert pool.pending == 3
+
+            # the job a worker is running can't be stopped, it holds its slot
+            # until done
+            for job in running:
+                job.cancel()
+            await asyncio.sleep(0.05)
+            assert pool.pending >= 1
+            for _ in range(100):
+                if not pool.pending:
+                    break
+                await asyncio.sleep(0.05)
+            assert pool.pending == 0
+        finally:
+            pool.shutdown()
+
+    asyncio.run(main())
+
+
+def test_worker_pool_replaces_broken_pool():
+
+    async def main():
+        pool = WorkerPool(workers=1, max_pending=2)
+        try:
+            with pytest.raises(HTTPException) as exc:
+                await pool.run(dying_job)
+            assert exc.value.status_code == 503
+            assert pool.executor is None
+            assert pool.pending == 0
+
+            assert await pool.run(sleep_job, 0) == 0
+        finally:
+            pool.shutdown()
+
+    asyncio.run(main())
+
+
+def test_worker_pool_replaces_pool_broken_while_idle():
+
+    async def main():
+        pool = WorkerPool(workers=1, max_pending=2)
+        try:
+            assert await pool.run(sleep_job, 0) == 0
+            broken = pool.executor
+
+            # a worker dies outside run, the next submit finds the pool broken
+            with pytest.raises(BrokenProcessPool):
+                await asyncio.wrap_future(broken.submit(dying_job))
+
+            assert await pool.run(sleep_job, 0) == 0
+            assert pool.executor is not broken
+            assert pool.pending == 0
+        finally:
+            pool.shutdown()
+
+    asyncio.run(main())
+
+
+def test_verify_proof():
+
+    args = Map.defaults()
+    args.secret = secrets.token_bytes(nbytes=32).hex()
+    args.seed = secrets.token_bytes(nbytes=8).hex()
+    v = Map.from_args(args).vrf_inputs(format=None)
+    proof = v["proof"]
+
+    assert verify_proof(proof["public_key"], v["alpha"], proof["pi"]) == proof["beta"]
+    assert verify_proof(proof["public_key"], v["alpha"] + " ", proof["pi"]) == ""
+    assert verify_proof(proof["public_key"], v["alpha"], "00" * 80) == ""
+    assert verify_proof("not hex", v["alpha"], proof["pi"]) == ""
+
+
+def test_generate_map_variants():
+
+    args = Map.defaults()
+    args.secret = secrets.token_bytes(nbytes=32).hex()
+    args.seed = secrets.token_bytes(nbytes=8).hex()
+    variants = generate_map(Map.from_args(args).vrf_inputs(format=None))
+
+    # one generation renders every variant
+    assert tuple(variants) == MAP_VARIANTS
+    assert variants["json"].startswith('{"model_type": "tinykeep"')
+    assert "Rooms" not in variants["svg"]
+    assert "Rooms" in variants["svg-legend"]
+
+
+@pytest.mark.parametrize(
+    "body",
+    [
+        dict(secret="zz"),
+        dict(secret="11" * 31),
+        dict(secret="11" * 32, seed="abc"),
+        dict(seed="not hex"),
+    ],
+)
+def test_commit_rejects_bad_hex(body):
+
+    with TestClient(app) as client:
+        r = client.post("/commit/", json=dict(gp=dict(), **body))
+    assert r.status_code == 422
+
+
+def generate_request() -> dict:
+    """a /generate/ request body for a fresh commitment"""
+    args = Map.defaults()
+    args.secret = secrets.token_bytes(nbytes=32).hex()
+    args.seed = secrets.token_bytes(nbytes=8).hex()
+    v = Map.from_args(args).vrf_inputs(format=None)
+    return dict(alpha=v["alpha"], **v["proof"])
+
+
+def test_verify_endpoint():
+
+    req = generate_request()
+    bad_pi = dict(req, pi=req["pi"][:-2] + ("00" if req["pi"][-2:] != "00" else "01"))
+    with TestClient(app) as client:
+        assert client.post("/verify/", json=req).json() == dict(valid=True)
+        assert client.post("/verify/", json=dict(req, beta="00" * 64)).json() == dict(
+            valid=False, message="beta is not the hash proven by pi")
+        assert client.post("/verify/", json=bad_pi).json() == dict(
+            valid=False, message="pi is not a proof for the public_key and alpha")
+
+
+def test_generate_verify_rejects_bad_proof():
+
+    req = generate_request()
+    with TestClient(app) as client:
+        r = client.post("/generate/?verify=true", json=dict(req, beta="00" * 64))
+        assert r.status_code == 422
+        assert r.json()["detail"]["message"] == "beta is not the hash proven by pi"
+
+        r = client.post("/generate/?verify=true", json=req)
+        assert r.status_code == 200
+        assert r.json()["vrf_inputs"]["alpha"] == req["alpha"]
+
+
+def test_verify_memoised(monkeypatch):
+
+    runs = []
+    run = main.pool.run
+
+    async def counting_run(fn, *args):
+        runs.append(fn)
+        return await run(fn, *args)
+
+    monkeypatch.setattr(main.pool, "run", counting_run)
+
+    req = generate_request()
+    bad = dict(req, alpha=req["alpha"] + " ")
+    with TestClient(app) as client:
+        for _ in range(2):
+            assert client.post("/verify/", json=req).json()["valid"]
+            assert not client.post("/verify/", json=bad).json()["valid"]
+        # a failed proof is remembered too, a second call never reaches the pool
+        assert runs == [verify_proof, verify_proof]
+
+        # the beta doesn't key the memo, only whether it matches the proven one
+        assert not client.post("/verify/", json=dict(req, beta="00" * 64)).json()["valid"]
+        assert runs == [verify_proof, verify_proof]
+
+
+def test_generate_reads_directory_once(tmp_path, monkeypatch):
+
+    req = generate_request()
+    stored = MapCache(1024, directory=tmp_path)
+    stored.put(req["alpha"], "json", '{"model_type": "tinykeep", "model": {}}')
+    stored.put(req["alpha"], "svg", "<svg/>")
+    stored.put(req["alpha"], "svg-legend", "<svg>legend</svg>")
+
+    cache = MapCache(1024, directory=tmp_path)
+    reads = []
+    read = cache._read
+
+    def counting_read(key):
+        reads.append(key)
+        return read(key)
+
+    async def no_run(fn, *args):
+        raise AssertionError(f"{fn.__name__} reached the worker pool")
+
+    monkeypatch.setattr(cache, "_read", counting_read)
+    monkeypatch.setattr(main, "cache", cache)
+    monkeypatch.setattr(main.pool, "run", no_run)
+
+    async def burst():
+        body = GenerateRequest(**req)
+        return await asyncio.gather(*[
+            main.generate(body, svg=svg, svg_legend=svg_legend)
+            for svg, svg_legend in [(True, True), (False, False), (True, False)] * 5
+        ])
+
+    responses = asyncio.run(burst())
+    assert [r.body.decode() for r in responses[:3:2]] == ["<svg>legend</svg>", "<svg/>"]
+    assert json.loads(responses[1].body)["model"] == {}
+
+    # the burst read each variant from the directory once, then from memory
+    assert len(reads) == len(MAP_VARIANTS)
@@ -0,0 +1,147 @@
+# Benchmarks for the VRF operations in ec.py
+
+# Times the public API and the hottest internal routines across many keys and alpha strings and
+# reports ops/sec and p50/p99 latencies as JSON. Every timing is also divided by a calibration
+# loop of plain field multiplications so results recorded on one machine can be compared with
+# another; bench_test.py checks these normalised medians against bench_baseline.json.
+#
+#     python3 bench.py                          # print the JSON report
+#     python3 bench.py --iterations 20 --seed 1 --update-baseline   # as run by bench_test.py
+
+import argparse
+import json
+import os
+import random  # Intentionally deterministic
+import sys
+import time
+
+if sys.version_info[0] != 3 or sys.version_info[1] < 7:
+    print("Requires Python v3.7+")
+    sys.exit()
+
+import ec
+
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bench_baseline.json')
+CALIBRATION_MULTIPLIES = 20000
+
+
+def calibrate():
+    """Seconds taken by CALIBRATION_MULTIPLIES field multiplications, the best of three runs"""
+    best = None
+    for _ in range(3):
+        x = ec.BASEx
+        start = time.perf_counter()
+        for _ in range(CALIBRATION_MULTIPLIES):
+            x = x * ec.BASEy % ec.PRIME
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def _cases(iterations, seed):
+    """Deterministic (sk, alpha_string, public_key, pi_string, public_point) cases, one per iteration"""
+    rng = random.Random(seed)
+    cases = []
+    for _ in range(iterations):
+        sk = rng.getrandbits(256).to_bytes(32, 'little')
+        alpha_string = rng.getrandbits(256).to_bytes(32, 'little')
+        _, pi_string = ec.ecvrf_prove(sk, alpha_string)
+        public_key = ec.get_public_key(sk)
+        cases.append((sk, alpha_string, public_key, pi_string, ec._decode_point(public_key)))
+    return cases
+
+
+def _operations():
+    """name -> function of a case, timed once per case"""
+    return {
+        'get_public_key': lambda case: ec.get_public_key(case[0]),
+        'ecvrf_prove': lambda case: ec.ecvrf_prove(case[0], case[1]),
+        'ecvrf_proof_to_hash': lambda case: ec.ecvrf_proof_to_hash(case[3]),
+        'ecvrf_verify': lambda case: ec.ecvrf_verify(case[2], case[3], case[1]),
+        '_scalar_multiply': lambda case: ec._scalar_multiply(ec.BASE, int.from_bytes(case[3][48:], 'little')),
+        # Any point but BASE takes the variable base wNAF path, as x*H, k*H and c*Gamma do
+        '_scalar_multiply_variable_base':
+            lambda case: ec._scalar_multiply(case[4], int.from_bytes(case[3][48:], 'little')),
+        '_inverse': lambda case: ec._inverse(int.from_bytes(case[3][48:], 'little')),
+    }
+
+
+def _percentile(ordered, fraction):
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def run(iterations=100, seed=0, operations=None):
+    """Time each operation over `iterations` cases and return the report as a dict"""
+    calibration = calibrate()
+    cases = _cases(iterations, seed)
+    ec._get_base_table()  # Built once per process, not part of any single operation
+
+    report = {
+        'backend': ec.get_backend(),
+        'iterations': iterations,
+        'calibration_seconds': calibration,
+        'operations': {},
+    }
+    for name, operation in _operations().items():
+        if operations and name not in operations:
+            continue
+        timings = []
+        for case in cases:
+            start = time.perf_counter()
+            operation(case)
+            timings.append(time.perf_counter() - start)
+        timings.sort()
+        p50 = _percentile(timings, 0.5)
+        report['operations'][name] = {
+            'ops_per_sec': len(timings) / sum(timings),
+            'p50_us': p50 * 1e6,
+            'p99_us': _percentile(timings, 0.99) * 1e6,
+            'p50_normalised': p50 / calibration,
+        }
+    return report
+
+
+def load_baseline(path=BASELINE_FILE):
+    """The stored normalised p50 per backend and operation, {} if there is none"""
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def update_baseline(reports, path=BASELINE_FILE):
+    """Record the slowest normalised median of each operation across the reports as the baseline"""
+    baseline = load_baseline(path)
+    for report in reports:
+        previous = baseline.get(report['backend'], {}) if report is not reports[0] else {}
+        baseline[report['backend']] = {
+            name: round(max(result['p50_normalised'], previous.get(name, 0.0)), 6)
+            for name, result in report['operations'].items()
+        }
+    with open(path, 'w') as f:
+        json.dump(baseline, f, indent=2, sort_keys=True)
+        f.write('\n')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the VRF operations in ec.py")
+    parser.add_argument('--iterations', type=int, default=100)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--backend', default=None, help="one of {}".format(", ".join(ec.BACKENDS)))
+    parser.add_argument('--update-baseline', action='store_true',
+                        help="record the slowest of --repeat runs as the backend's baseline")
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args(argv)
+
+    if args.backend:
+        ec.set_backend(args.backend)
+    if not args.update_baseline:
+        print(json.dumps(run(iterations=args.iterations, seed=args.seed), indent=2, sort_keys=True))
+        return
+    reports = [run(iterations=args.iterations, seed=args.seed) for _ in range(args.repeat)]
+    update_baseline(reports)
+    print(json.dumps(reports[-1], indent=2, sort_keys=True))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,35 @@
+# Performance regression checks for ec.py against the baselines recorded by bench.py
+
+import json
+import os
+
+import pytest
+
+import bench
+
+# A normalised median more than TOLERANCE times its baseline fails. Timings are noisy, especially
+# on shared CI machines, so this only catches real regressions, e.g. losing a fast path.
+TOLERANCE = float(os.environ.get('VRF_BENCH_TOLERANCE', '3.0'))
+
+
+@pytest.fixture(scope='module')
+def report():
+    return bench.run(iterations=20, seed=1)
+
+
+def test_report_is_json(report):
+    decoded = json.loads(json.dumps(report))
+    assert set(decoded['operations']) == set(bench._operations())
+    for result in decoded['operations'].values():
+        assert result['ops_per_sec'] > 0
+        assert result['p50_us'] <= result['p99_us']
+
+
+@pytest.mark.parametrize('operation', list(bench._operations()))
+def test_no_regression(report, operation):
+    baseline = bench.load_baseline().get(report['backend'])
+    if not baseline or operation not in baseline:
+        pytest.skip("no baseline for the {} backend, see bench.py --update-baseline".format(report['backend']))
+    actual = report['operations'][operation]['p50_normalised']
+    assert actual <= baseline[operation] * TOLERANCE, \
+        "{} p50 is {:.1f}x the baseline".format(operation, actual / baseline[operation])
@@ -7,6 +7,7 @@
 
 
 import hashlib
+import os
 import sys
 
 if sys.version_info[0] != 3 or sys.version_info[1] < 7:
@@ -20,31 +21,30 @@ if sys.version_info[0] != 3 or sys.version_info[1] < 7:
 def ecvrf_prove(sk, alpha_string):
     """
     Input:
-        sk - VRF private key (32 bytes)
+        sk - VRF private key (32 bytes), or a VrfSigner holding it
         alpha_string - input alpha, an octet string
     Output:
         ("VALID", pi_string) - where pi_string is the VRF proof, octet string of length ptLen+n+qLen
         (80) bytes, or ("INVALID", []) upon failure
     """
     # 1. Use sk to derive the VRF secret scalar x and the VRF public key y = x*B
-    secret_scalar_x = _get_secret_scalar(sk)
-    public_key_y = get_public_key(sk)
+    signer = sk if isinstance(sk, VrfSigner) else VrfSigner(sk)
+    secret_scalar_x = signer.secret_scalar
+    public_key_y = signer.public_key
 
     # 2. H = ECVRF_hash_to_curve(suite_string, y, alpha_string)
-    h = _ecvrf_hash_to_curve_elligator2_25519(SUITE_STRING, public_key_y, alpha_string)
-    if h == "INVALID":
-        return "INVALID", []
-
     # 3. h_string = point_to_string(H)
-    h_string = _decode_point(h)
-    if h_string == "INVALID":
+    # (h is the encoded point and h_string the point here, the fast path returns both)
+    h = _ecvrf_hash_to_curve_elligator2_25519_fast(SUITE_STRING, public_key_y, alpha_string)
+    if h == "INVALID":
         return "INVALID", []
+    h, h_string = h
 
     # 4. Gamma = x*H
     gamma = _scalar_multiply(p=h_string, e=secret_scalar_x)
 
     # 5. k = ECVRF_nonce_generation(sk, h_string)
-    k = _ecvrf_nonce_generation_rfc8032(sk, h)
+    k = _ecvrf_nonce_generation_rfc8032(signer, h)
 
     # 6. c = ECVRF_hash_points(H, Gamma, k*B, k*H)
     k_b = _scalar_multiply(p=BASE, e=k)
@@ -126,25 +126,20 @@ def ecvrf_verify(y, pi_string, alpha_string):
     gamma, c, s = d
 
     # 4. H = ECVRF_hash_to_curve(suite_string, y, alpha_string)
-    h = _ecvrf_hash_to_curve_elligator2_25519(SUITE_STRING, y, alpha_string)
+    h = _ecvrf_hash_to_curve_elligator2_25519_fast(SUITE_STRING, y, alpha_string)
     if h == "INVALID":
         return "INVALID", []
+    h, h_point = h
 
     # 5. U = s*B - c*y
     y_point = _decode_point(y)
-    h_point = _decode_point(h)
-    if y_point == "INVALID" or h_point == "INVALID":
+    if y_point == "INVALID":
         return "INVALID", []
-    s_b = _scalar_multiply(p=BASE, e=s)
-    c_y = _scalar_multiply(p=y_point, e=c)
-    nc_y = [PRIME - c_y[0], c_y[1]]
-    u = _edwards_add(s_b, nc_y)
+    u = _multi_scalar_multiply_extended([(s, BASE), (c, [PRIME - y_point[0], y_point[1]])])
 
     # 6. V = s*H - c*Gamma
-    s_h = _scalar_multiply(p=h_point, e=s)
-    c_g = _scalar_multiply(p=gamma, e=c)
-    nc_g = [PRIME - c_g[0], c_g[1]]
-    v = _edwards_add(nc_g, s_h)
+    v = _multi_scalar_multiply_extended([(s, h_point), (c, [PRIME - gamma[0], gamma[1]])])
+    u, v = _from_extended_batch([u, v])
 
     # 7. c’ = ECVRF_hash_points(H, Gamma, U, V)
     cp = _ecvrf_hash_points(h_point, gamma, u, v)
@@ -159,17 +154,89 @@ def ecvrf_verify(y, pi_string, alpha_string):
         return "INVALID", []
 
 
+def ecvrf_verify_batch(items):
+    """
+    Input:
+        items - iterable of (y, pi_string, alpha_string) tuples, as for ecvrf_verify
+    Output:
+        list with one ("VALID", beta_string) or ("INVALID", []) entry per item, in order
+    """
+    # The proof carries (Gamma, c, s) rather than (U, V), so U and V have to be reconstructed for
+    # every item in order to recompute c; there is no single combined equation to check. What is
+    # amortised is the conversion of every U, V and cofactor*Gamma back to affine coordinates,
+    # which shares one inversion across the whole batch. The per item results are exactly those
+    # of ecvrf_verify.
+    results = []
+    pending = []
+    points = []
+    for y, pi_string, alpha_string in items:
+        results.append(("INVALID", []))
+        d = _ecvrf_decode_proof(pi_string)
+        if d == "INVALID":
+            continue
+        gamma, c, s = d
+        h = _ecvrf_hash_to_curve_elligator2_25519_fast(SUITE_STRING, y, alpha_string)
+        if h == "INVALID":
+            continue
+        h_point = h[1]
+        y_point = _decode_point(y)
+        if y_point == "INVALID":
+            continue
+        pending.append((len(results) - 1, h_point, gamma, c))
+        points.append(_multi_scalar_multiply_extended([(s, BASE), (c, [PRIME - y_point[0], y_point[1]])]))
+        points.append(_multi_scalar_multiply_extended([(s, h_point), (c, [PRIME - gamma[0], gamma[1]])]))
+        points.append(_scalar_multiply_extended(_to_extended(gamma), COFACTOR))
+
+    if not points:
+        return results
+
+    points = _from_extended_batch(points)
+    for i, (index, h_point, gamma, c) in enumerate(pending):
+        u, v, cofactor_gamma = points[3 * i:3 * i + 3]
+        if c != _ecvrf_hash_points(h_point, gamma, u, v):
+            continue
+        results[index] = "VALID", _hash(SUITE_STRING + bytes([0x03]) + _encode_point(cofactor_gamma))
+    return results
+
+
 def get_public_key(sk):
     """Calculate and return the public_key as an encoded point string (bytes)
     """
-    secret_int = _get_secret_scalar(sk)
-    public_point = _scalar_multiply(p=BASE, e=secret_int)
-    public_string = _encode_point(public_point)
-    return public_string
+    if isinstance(sk, VrfSigner):
+        return sk.public_key
+    return _get_public_key_from_scalar(_get_secret_scalar(sk))
+
+
+class VrfSigner:
+    """A VRF private key with the values derived from it cached
+
+    Deriving the secret scalar and public key costs a base point multiplication, so callers
+    proving many alpha strings under one long lived key should make a VrfSigner once and pass it
+    to ecvrf_prove (or use its prove method) in place of the raw key bytes.
+    """
+
+    def __init__(self, sk):
+        self.secret_scalar = _get_secret_scalar(sk)
+        self.public_key = _get_public_key_from_scalar(self.secret_scalar)
+        # RFC 8032 nonce generation steps 1 and 2 depend only on sk
+        self.nonce_prefix = _hash(sk)[32:]
+
+    def prove(self, alpha_string):
+        """ecvrf_prove with this key"""
+        return ecvrf_prove(self, alpha_string)
 
 
 # Internal functions
 
+def _get_public_key_from_scalar(secret_int):
+    """Encoded public key for the secret scalar"""
+    public_string = _backend.base_multiply_encoded(secret_int)
+    if public_string is None:
+        public_point = _scalar_multiply(p=BASE, e=secret_int)
+        public_string = _encode_point(public_point)
+    return public_string
+
+
 # Section 5.4.1.2. ECVRF_hash_to_curve_elligator2_25519
 def _ecvrf_hash_to_curve_elligator2_25519(suite_string, y, alpha_string):
     """
@@ -211,7 +278,7 @@ def _ecvrf_hash_to_curve_elligator2_25519(suite_string, y, alpha_string):
     w = u * (u ** 2 + A * u + 1) % PRIME
 
     # 10. Let e equal the Legendre symbol of w and p (see note after item 16)
-    e = pow(w, (PRIME - 1) // 2, PRIME)
+    e = _backend.pow(w, (PRIME - 1) // 2)
 
     # 11. If e is equal to 1 then final_u = u; else final_u = (-A - u) mod p (see note after item 16)
     final_u = (e * u + (e - 1) * A * TWO_INV) % PRIME
@@ -242,20 +309,84 @@ def _ecvrf_hash_to_curve_elligator2_25519(suite_string, y, alpha_string):
     return h_point
 
 
+def _ecvrf_hash_to_curve_elligator2_25519_fast(suite_string, y, alpha_string):
+    """
+    The same map as _ecvrf_hash_to_curve_elligator2_25519, restructured to avoid inversions.
+    Output:
+        (H, H_point) - H encoded as above and as an affine point, or INVALID upon failure
+    With t = 1 + 2*r^2 every value is kept as a fraction over t:
+        u = -A / t, so Legendre(w) = Legendre(w * t^4) = Legendre(-A * t * (A^2 - A^2 * t + t^2))
+        final_u = n / t with n = -A if e == 1 else A * (1 - t)
+        y_coordinate = (n - t) / (n + t)
+    x is recovered from the fractional y with a single exponentiation (RFC 8032 section 5.1.3),
+    the cofactor is cleared with three doublings in extended coordinates and the only inversion
+    is the final conversion back to affine.
+    """
+    assert suite_string == SUITE_STRING
+    # Steps 1 to 7 are unchanged
+    hash_string = _hash(suite_string + bytes([0x01]) + y + alpha_string)
+    r_string = bytearray(hash_string[0:32])
+    r_string[31] = int(r_string[31] & 0x7f)
+    r = int.from_bytes(r_string, 'little')
+
+    # 8. to 11. with u = -A / t
+    t = (1 + 2 * r * r) % PRIME
+    e = _backend.pow(-A * t * (A * A - A * A * t + t * t) % PRIME, (PRIME - 1) // 2)
+    n = PRIME - A if e == 1 else A * (1 - t) % PRIME
+
+    # 12. y_coordinate = (n - t) / (n + t), as the fraction y_num / z
+    y_num, z = (n - t) % PRIME, (n + t) % PRIME
+    if z == 0:
+        y_num, z = 0, 1  # _inverse(0) is 0 in the reference, so y_coordinate is 0
+
+    # 13. and 14. string_to_point with the sign bit clear: x = sqrt((y^2 - 1) / (d*y^2 + 1)), even
+    yy, zz = y_num * y_num % PRIME, z * z % PRIME
+    u, v = (yy - zz) % PRIME, (D * yy + zz) % PRIME
+    v3 = v * v * v % PRIME
+    x = u * v3 * _backend.pow(u * v3 * v3 * v % PRIME, (PRIME - 5) // 8) % PRIME
+    vxx = v * x * x % PRIME
+    if vxx != u:
+        if vxx != PRIME - u:
+            return "INVALID"
+        x = x * II % PRIME
+    if x & 1:
+        x = PRIME - x
+
+    # 15. H = cofactor * H_prelim, cofactor is 8
+    h = [x * z % PRIME, y_num, z, x * y_num % PRIME]
+    for _ in range(3):
+        h = _edwards_double_extended(h)
+
+    # 16. Output H
+    h_point = _from_extended(h)
+    h_string = _encode_point(h_point)
+
+    if 'test_dict' in globals():
+        w = -A * (A * A - A * A * t + t * t) * _inverse(t * t * t) % PRIME
+        _assert_and_sample(['r', 'w', 'e'],
+                           [r_string, int.to_bytes(w, 32, 'little'), int.to_bytes(e, 32, 'little')])
+
+    return h_string, h_point
+
+
 # 5.4.2.2. ECVRF Nonce Generation From RFC 8032
 def _ecvrf_nonce_generation_rfc8032(sk, h_string):
     """
     Input:
-        sk - an ECVRF secret key as bytes
+        sk - an ECVRF secret key as bytes, or a VrfSigner
         h_string - an octet string
     Output:
         k - an integer between 0 and q-1
     """
-    # 1. hashed_sk_string = Hash (sk)
-    hashed_sk_string = _hash(sk)
+    if isinstance(sk, VrfSigner):
+        # 1. and 2. were computed once by the signer
+        truncated_hashed_sk_string = sk.nonce_prefix
+    else:
+        # 1. hashed_sk_string = Hash (sk)
+        hashed_sk_string = _hash(sk)
 
-    # 2. truncated_hashed_sk_string = hashed_sk_string[32]...hashed_sk_string[63]
-    truncated_hashed_sk_string = hashed_sk_string[32:]
+        # 2. truncated_hashed_sk_string = hashed_sk_string[32]...hashed_sk_string[63]
+        truncated_hashed_sk_string = hashed_sk_string[32:]
 
     # 3. k_string = Hash(truncated_hashed_sk_string || h_string)
     k_string = _hash(truncated_hashed_sk_string + h_string)
@@ -362,13 +493,51 @@ def _assert_and_sample(keys, actuals):
 
 def _edwards_add(p, q):
     """Edwards curve point addition"""
-    x1 = p[0]
-    y1 = p[1]
-    x2 = q[0]
-    y2 = q[1]
-    x3 = (x1 * y2 + x2 * y1) * _inverse(1 + D * x1 * x2 * y1 * y2)
-    y3 = (y1 * y2 + x1 * x2) * _inverse(1 - D * x1 * x2 * y1 * y2)
-    return [x3 % PRIME, y3 % PRIME]
+    return _from_extended(_edwards_add_extended(_to_extended(p), _to_extended(q)))
+
+
+# The textbook affine formulas need two inversions per addition. Instead, points are carried through
+# the scalar multiplications in extended twisted Edwards coordinates (X:Y:Z:T) with x = X/Z, y = Y/Z
+# and x*y = T/Z. See https://eprint.iacr.org/2008/522 and RFC 8032 section 5.1.4. These formulas
+# are inversion free, so only the conversion back to affine coordinates pays for an inversion.
+
+def _to_extended(p):
+    """Convert affine point [x, y] to extended coordinates [X, Y, Z, T]"""
+    return [p[0], p[1], 1, p[0] * p[1] % PRIME]
+
+
+def _from_extended(p):
+    """Convert extended point [X, Y, Z, T] to affine [x, y]; costs the one inversion"""
+    z_inv = _inverse(p[2])
+    return [p[0] * z_inv % PRIME, p[1] * z_inv % PRIME]
+
+
+def _from_extended_batch(points):
+    """Convert several extended points to affine, sharing a single inversion"""
+    z_invs = _batch_inverse([p[2] for p in points])
+    return [[p[0] * z_inv % PRIME, p[1] * z_inv % PRIME] for p, z_inv in zip(points, z_invs)]
+
+
+def _edwards_add_extended(p, q):
+    """Edwards curve point addition in extended coordinates (add-2008-hwcd-3, a = -1)"""
+    a = (p[1] - p[0]) * (q[1] - q[0]) % PRIME
+    b = (p[1] + p[0]) * (q[1] + q[0]) % PRIME
+    c = p[3] * D2 * q[3] % PRIME
+    d = 2 * p[2] * q[2] % PRIME
+    e, f, g, h = b - a, d - c, d + c, b + a
+    return [e * f % PRIME, g * h % PRIME, f * g % PRIME, e * h % PRIME]
+
+
+def _edwards_double_extended(p):
+    """Edwards curve point doubling in extended coordinates (dbl-2008-hwcd, a = -1)"""
+    a = p[0] * p[0] % PRIME
+    b = p[1] * p[1] % PRIME
+    c = 2 * p[2] * p[2] % PRIME
+    h = a + b
+    e = h - (p[0] + p[1]) * (p[0] + p[1])
+    g = a - b
+    f = c + g
+    return [e * f % PRIME, g * h % PRIME, f * g % PRIME, e * h % PRIME]
 
 
 def _encode_point(p):
@@ -410,8 +579,8 @@ def _hash(message):
 
 
 def _inverse(x):
-    """Calculate inverse via Fermat's little theorem"""
-    return pow(x, PRIME - 2, PRIME)
+    """Calculate inverse via the selected backend (Fermat's little theorem for the reference)"""
+    return _backend.inverse(x)
 
 
 def _is_on_curve(p):
@@ -424,19 +593,169 @@ def _is_on_curve(p):
 
 def _scalar_multiply(p, e):
     """Scalar multiplied by curve point"""
-    if e == 0:
-        return [0, 1]
-    q = _scalar_multiply(p, e // 2)
-    q = _edwards_add(q, q)
-    if e & 1:
-        q = _edwards_add(q, p)
+    if p == BASE:
+        return _from_extended(_scalar_multiply_base_extended(e))
+    return _from_extended(_scalar_multiply_extended(_to_extended(p), e))
+
+
+def _scalar_multiply_extended(p, e):
+    """Scalar multiplied by curve point, with both point and result in extended coordinates
+
+    Iterative width-w NAF: one doubling per bit and, on average, one addition per w+1 bits"""
+    width = WNAF_WIDTH if e.bit_length() > 64 else 2
+    odd_multiples = _odd_multiples(p, 1 << (width - 2))
+    q = [0, 1, 1, 0]
+    for digit in reversed(_wnaf(e, width)):
+        q = _edwards_double_extended(q)
+        if digit > 0:
+            q = _edwards_add_extended(q, odd_multiples[digit >> 1])
+        elif digit < 0:
+            q = _edwards_add_extended(q, _negate_extended(odd_multiples[-digit >> 1]))
     return q
 
 
+def _multi_scalar_multiply_extended(terms):
+    """Sum of e*p for the (e, p) affine terms, result in extended coordinates
+
+    Straus' method: the wNAF digits of every scalar are consumed in a single interleaved pass so
+    the doublings are shared. Terms on BASE are taken from the fixed-base table instead, which
+    needs no doublings at all."""
+    q = [0, 1, 1, 0]
+    chains = []
+    for e, p in terms:
+        if p == BASE:
+            q = _edwards_add_extended(q, _scalar_multiply_base_extended(e))
+            continue
+        width = WNAF_WIDTH if e.bit_length() > 64 else 2
+        chains.append((_wnaf(e, width), _odd_multiples(_to_extended(p), 1 << (width - 2))))
+    if not chains:
+        return q
+    acc = [0, 1, 1, 0]
+    for i in range(max(len(digits) for digits, _ in chains) - 1, -1, -1):
+        acc = _edwards_double_extended(acc)
+        for digits, odd_multiples in chains:
+            if i >= len(digits) or digits[i] == 0:
+                continue
+            if digits[i] > 0:
+                acc = _edwards_add_extended(acc, odd_multiples[digits[i] >> 1])
+            else:
+                acc = _edwards_add_extended(acc, _negate_extended(odd_multiples[-digits[i] >> 1]))
+    return _edwards_add_extended(q, acc)
+
+
+def _wnaf(e, width):
+    """Width-w non-adjacent form of e, least significant digit first. Digits are odd or zero"""
+    digits = []
+    window = 1 << width
+    while e > 0:
+        if e & 1:
+            digit = e & (window - 1)
+            if digit >= window >> 1:
+                digit -= window
+            e -= digit
+        else:
+            digit = 0
+        digits.append(digit)
+        e >>= 1
+    return digits
+
+
+def _odd_multiples(p, count):
+    """The extended points [p, 3p, 5p, ...] up to (2*count - 1)p"""
+    multiples = [p]
+    if count > 1:
+        p2 = _edwards_double_extended(p)
+        for _ in range(count - 1):
+            multiples.append(_edwards_add_extended(multiples[-1], p2))
+    return multiples
+
+
+def _negate_extended(p):
+    """Negate an extended point, -(x, y) = (-x, y)"""
+    return [-p[0] % PRIME, p[1], p[2], -p[3] % PRIME]
+
+
+# Multiples of the constant BASE point use a fixed-base table instead. Row i holds j * 16^i * B for
+# j in 1..8, stored in (y+x, y-x, 2*d*x*y) form so that each table addition skips the Z and T
+# products. The scalar is recoded into 64 signed radix-16 digits in -8..8, which makes a base
+# multiplication 64 table additions and no doublings. The table is built once, on first use.
+_base_table = None
+
+
+def _get_base_table():
+    """Build (once) and return the fixed-base table of signed radix-16 multiples of BASE"""
+    global _base_table
+    if _base_table is not None:
+        return _base_table
+    rows = []
+    row_base = _to_extended(BASE)
+    for _ in range(BASE_TABLE_ROWS):
+        row = [row_base]
+        for _ in range(7):
+            row.append(_edwards_add_extended(row[-1], row_base))
+        rows.append(row)
+        row_base = _edwards_double_extended(row[7])  # 16 * row_base
+    z_invs = iter(_batch_inverse([q[2] for row in rows for q in row]))
+    table = []
+    for row in rows:
+        entries = []
+        for q in row:
+            z_inv = next(z_invs)
+            x, y = q[0] * z_inv % PRIME, q[1] * z_inv % PRIME
+            entries.append(((y + x) % PRIME, (y - x) % PRIME, D2 * x * y % PRIME))
+        table.append(entries)
+    _base_table = table
+    return _base_table
+
+
+def _edwards_add_precomputed(p, q):
+    """Add extended point p and affine table entry q = (y+x, y-x, 2*d*x*y)"""
+    a = (p[1] - p[0]) * q[1] % PRIME
+    b = (p[1] + p[0]) * q[0] % PRIME
+    c = p[3] * q[2] % PRIME
+    d = 2 * p[2]
+    e, f, g, h = b - a, d - c, d + c, b + a
+    return [e * f % PRIME, g * h % PRIME, f * g % PRIME, e * h % PRIME]
+
+
+def _scalar_multiply_base_extended(e):
+    """BASE multiplied by scalar e using the fixed-base table, result in extended coordinates"""
+    table = _get_base_table()
+    e = e % ORDER  # BASE generates the prime order subgroup
+    q = [0, 1, 1, 0]
+    for row in table:
+        digit = e & 15
+        e >>= 4
+        if digit > 8:
+            digit -= 16
+            e += 1
+        if digit > 0:
+            q = _edwards_add_precomputed(q, row[digit - 1])
+        elif digit < 0:
+            y_plus_x, y_minus_x, t2d = row[-digit - 1]
+            q = _edwards_add_precomputed(q, (y_minus_x, y_plus_x, PRIME - t2d))
+    return q
+
+
+def _batch_inverse(values):
+    """Invert every (non zero) value using a single inversion (Montgomery's trick)"""
+    prefix = []
+    acc = 1
+    for v in values:
+        prefix.append(acc)
+        acc = acc * v % PRIME
+    acc_inv = _inverse(acc)
+    result = [0] * len(values)
+    for i in range(len(values) - 1, -1, -1):
+        result[i] = acc_inv * prefix[i] % PRIME
+        acc_inv = acc_inv * values[i] % PRIME
+    return result
+
+
 def _x_recover(y):
     """Recover x coordinate from y coordinate"""
     xx = (y * y - 1) * _inverse(D * y * y + 1)
-    x = pow(xx, (PRIME + 3) // 8, PRIME)
+    x = _backend.pow(xx, (PRIME + 3) // 8)
     if (x * x - xx) % PRIME != 0:
         x = (x * II) % PRIME
     if x % 2 != 0:
@@ -444,28 +763,142 @@ def _x_recover(y):
     return x
 
 
-# Constants, some of which are calculated/checked at runtime using above routines
-# See https://ed25519.cr.yp.to/python/checkparams.py
+# Arithmetic backends
+
+# The pure Python code above is the always available reference. The most expensive single steps are
+# the modular exponentiations behind _inverse, _x_recover and the Legendre symbol (~300 field
+# multiplies each) and the base point multiplication behind get_public_key. A backend can route
+# those to an optional native library when it is importable. Every backend must produce results
+# identical to the reference; see ec_backend_test.py. The backend is picked at import from the
+# VRF_BACKEND environment variable ("auto" by default) and can be changed with set_backend.
+
+class PythonBackend:
+    """Reference backend, Python's built in big integers"""
+    name = "python"
+
+    def pow(self, x, e):
+        """x^e mod PRIME"""
+        return pow(x, e, PRIME)
+
+    def inverse(self, x):
+        """x^-1 mod PRIME, zero for zero"""
+        return pow(x, PRIME - 2, PRIME)
+
+    def base_multiply_encoded(self, e):
+        """Encoded e*BASE, or None to use the generic code"""
+        return None
+
+
+class Gmpy2Backend(PythonBackend):
+    """GMP modular exponentiation and inversion via gmpy2"""
+    name = "gmpy2"
+
+    def __init__(self):
+        import gmpy2
+        self._gmpy2 = gmpy2
+        self._prime = gmpy2.mpz(PRIME)
+
+    def pow(self, x, e):
+        return int(self._gmpy2.powmod(x, e, self._prime))
+
+    def inverse(self, x):
+        if x % PRIME == 0:
+            return 0
+        return int(self._gmpy2.invert(x, self._prime))
+
+
+class NaclBackend(PythonBackend):
+    """libsodium's ed25519 base point multiplication via PyNaCl"""
+    name = "nacl"
+
+    def __init__(self):
+        from nacl.bindings import crypto_scalarmult_ed25519_base_noclamp
+        self._base_noclamp = crypto_scalarmult_ed25519_base_noclamp
+
+    def base_multiply_encoded(self, e):
+        # libsodium clears the top bit and rejects zero; BASE has prime order so reducing is exact
+        e = e % ORDER
+        if e == 0:
+            return None
+        return self._base_noclamp(e.to_bytes(32, 'little'))
+
+
+BACKENDS = {backend.name: backend for backend in [Gmpy2Backend, NaclBackend, PythonBackend]}
+_backend = PythonBackend()
+
+
+def available_backends():
+    """Names of the backends that can be used in this environment, fastest first"""
+    names = []
+    for name, backend in BACKENDS.items():
+        try:
+            backend()
+        except ImportError:
+            continue
+        names.append(name)
+    return names
+
+
+def get_backend():
+    """Name of the backend in use"""
+    return _backend.name
+
+
+def set_backend(name="auto"):
+    """Select the arithmetic backend by name, "auto" picks the fastest available"""
+    global _backend
+    if name == "auto":
+        for name, backend in BACKENDS.items():
+            try:
+                _backend = backend()
+            except ImportError:
+                continue
+            return name
+    if name not in BACKENDS:
+        raise ValueError("unknown VRF backend {}, expected one of {}".format(name, ", ".join(BACKENDS)))
+    _backend = BACKENDS[name]()  # Raises ImportError if the library is missing
+    return name
+
+
+# Constants. The derived values are literals so that importing this module does no curve arithmetic;
+# selftest() recomputes and checks them. See https://ed25519.cr.yp.to/python/checkparams.py
 SUITE_STRING = bytes([0x04])
 BITS = 256
 PRIME = 2 ** 255 - 19
 ORDER = 2 ** 252 + 27742317777372353535851937790883648493
 COFACTOR = 8
-TWO_INV = _inverse(2)
-II = pow(2, (PRIME - 1) // 4, PRIME)
+TWO_INV = 28948022309329048855892746252171976963317496166410141009864396001978282409975  # 1/2
+II = 19681161376707505956807079304988542015446066515923890162744021073123829784752  # sqrt(-1)
 A = 486662
-D = -121665 * _inverse(121666)
-BASEy = 4 * _inverse(5)
-BASEx = _x_recover(BASEy)
-BASE = [BASEx % PRIME, BASEy % PRIME]
-assert BITS >= 10
-assert 8 * len(_hash("hash input".encode("UTF-8"))) == 2 * BITS
-assert pow(2, PRIME - 1, PRIME) == 1
-assert PRIME % 4 == 1
-assert pow(2, ORDER - 1, ORDER) == 1
-assert ORDER >= 2 ** (BITS - 4)
-assert ORDER <= 2 ** (BITS - 3)
-assert pow(D, (PRIME - 1) // 2, PRIME) == PRIME - 1
-assert pow(II, 2, PRIME) == PRIME - 1
-assert _is_on_curve(BASE)
-assert _scalar_multiply(BASE, ORDER) == [0, 1]
+D = 37095705934669439343138083508754565189542113879843219016388785533085940283555  # -121665/121666
+D2 = 16295367250680780974490674513165176452449235426866156013048779062215315747161  # 2*D
+BASEy = 46316835694926478169428394003475163141307993866256225615783033603165251855960  # 4/5
+BASEx = 15112221349535400772501151409588531511454012693041857206046113283949847762202
+BASE = [BASEx, BASEy]
+BASE_TABLE_ROWS = 64  # 4 bit digits cover the 253 bit scalars, reduced mod ORDER
+WNAF_WIDTH = 5  # 8 precomputed odd multiples for variable base multiplication
+
+
+def selftest():
+    """Recompute the derived constants and check the curve parameters; raises AssertionError"""
+    assert BITS >= 10
+    assert 8 * len(_hash("hash input".encode("UTF-8"))) == 2 * BITS
+    assert pow(2, PRIME - 1, PRIME) == 1
+    assert PRIME % 4 == 1
+    assert pow(2, ORDER - 1, ORDER) == 1
+    assert ORDER >= 2 ** (BITS - 4)
+    assert ORDER <= 2 ** (BITS - 3)
+    assert TWO_INV == _inverse(2)
+    assert II == pow(2, (PRIME - 1) // 4, PRIME)
+    assert D == -121665 * _inverse(121666) % PRIME
+    assert D2 == 2 * D % PRIME
+    assert BASEy == 4 * _inverse(5) % PRIME
+    assert BASEx == _x_recover(BASEy) % PRIME
+    assert pow(D, (PRIME - 1) // 2, PRIME) == PRIME - 1
+    assert pow(II, 2, PRIME) == PRIME - 1
+    assert _is_on_curve(BASE)
+    assert _scalar_multiply(BASE, ORDER) == [0, 1]
+    assert _from_extended(_scalar_multiply_extended(_to_extended(BASE), ORDER)) == [0, 1]
+
+
+set_backend(os.environ.get("VRF_BACKEND", "auto"))
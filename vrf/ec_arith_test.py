@@ -0,0 +1,98 @@
+# Checks the optimised point arithmetic in ec.py against the affine reference formulas
+
+import random  # Intentionally deterministic
+
+import ec
+
+
+def _affine_add(p, q):
+    """The original ed25519.py affine addition, two inversions per call"""
+    x1, y1 = p
+    x2, y2 = q
+    x3 = (x1 * y2 + x2 * y1) * ec._inverse(1 + ec.D * x1 * x2 * y1 * y2)
+    y3 = (y1 * y2 + x1 * x2) * ec._inverse(1 - ec.D * x1 * x2 * y1 * y2)
+    return [x3 % ec.PRIME, y3 % ec.PRIME]
+
+
+def _affine_multiply(p, e):
+    q = [0, 1]
+    for bit in bin(e)[2:]:
+        q = _affine_add(q, q)
+        if bit == '1':
+            q = _affine_add(q, p)
+    return q
+
+
+def _random_point(rng):
+    return ec._scalar_multiply(ec.BASE, rng.getrandbits(252))
+
+
+def test_extended_add_and_double():
+    rng = random.Random(1)
+    for _ in range(8):
+        p, q = _random_point(rng), _random_point(rng)
+        pe, qe = ec._to_extended(p), ec._to_extended(q)
+        assert ec._from_extended(ec._edwards_add_extended(pe, qe)) == _affine_add(p, q)
+        assert ec._from_extended(ec._edwards_double_extended(pe)) == _affine_add(p, p)
+        assert ec._edwards_add(p, q) == _affine_add(p, q)
+
+
+def test_scalar_multiply_matches_affine():
+    rng = random.Random(2)
+    p = _random_point(rng)
+    for e in [0, 1, 2, 3, ec.COFACTOR, rng.getrandbits(128), rng.getrandbits(256)]:
+        assert ec._scalar_multiply(p, e) == _affine_multiply(p, e)
+    assert ec._scalar_multiply(ec.BASE, ec.ORDER) == [0, 1]
+
+
+def test_fixed_base_matches_variable_base():
+    rng = random.Random(3)
+    base = ec._to_extended(ec.BASE)
+    scalars = [0, 1, 8, 9, 0x88888888, ec.ORDER - 1, ec.ORDER, ec.ORDER + 5, 2 ** 256 - 1]
+    scalars += [rng.getrandbits(256) for _ in range(8)]
+    for e in scalars:
+        expected = ec._from_extended(ec._scalar_multiply_extended(base, e))
+        assert ec._from_extended(ec._scalar_multiply_base_extended(e)) == expected
+        assert ec._scalar_multiply(ec.BASE, e) == expected
+
+
+def test_batch_inverse():
+    rng = random.Random(4)
+    values = [rng.randrange(1, ec.PRIME) for _ in range(9)]
+    assert ec._batch_inverse(values) == [ec._inverse(v) for v in values]
+
+
+def test_wnaf_digits():
+    rng = random.Random(5)
+    for width in [2, 5]:
+        for e in [0, 1, 7, 8, ec.ORDER, rng.getrandbits(256)]:
+            digits = ec._wnaf(e, width)
+            assert sum(d << i for i, d in enumerate(digits)) == e
+            for i, d in enumerate(digits):
+                assert d == 0 or (d & 1 and abs(d) < 1 << (width - 1))
+                if d:
+                    assert not any(digits[i + 1:i + width])
+
+
+def test_multi_scalar_multiply():
+    rng = random.Random(6)
+    p, q = _random_point(rng), _random_point(rng)
+    for s, c in [(0, 0), (1, 0), (rng.getrandbits(256), rng.getrandbits(128)), (ec.ORDER, 3)]:
+        for a in [ec.BASE, p]:
+            expected = ec._edwards_add(ec._scalar_multiply(a, s), ec._scalar_multiply(q, c))
+            actual = ec._multi_scalar_multiply_extended([(s, a), (c, q)])
+            assert ec._from_extended_batch([actual])[0] == expected
+
+
+def test_selftest():
+    ec.selftest()
+
+
+def test_hash_to_curve_fast_matches_reference():
+    rng = random.Random(10)
+    for _ in range(64):
+        y = ec.get_public_key(rng.getrandbits(256).to_bytes(32, 'little'))
+        alpha_string = rng.getrandbits(8 * rng.randrange(40)).to_bytes(40, 'little')
+        h = ec._ecvrf_hash_to_curve_elligator2_25519(ec.SUITE_STRING, y, alpha_string)
+        assert ec._ecvrf_hash_to_curve_elligator2_25519_fast(ec.SUITE_STRING, y, alpha_string) == \
+            (h, ec._decode_point(h))
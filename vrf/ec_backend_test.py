@@ -0,0 +1,59 @@
+# Conformance of every available arithmetic backend with the reference, using the RFC test vectors
+
+import random  # Intentionally deterministic
+
+import pytest
+
+import ec
+
+# Section A.4. ECVRF-EDWARDS25519-SHA512-Elligator2, see ec_test.py for the intermediate values
+VECTORS = [
+    ('9d61b19deffd5a60ba844af492ec2cc44449c5697b326919703bac031cae7f60', '',
+     'd75a980182b10ab7d54bfed3c964073a0ee172f3daa62325af021a68f707511a',
+     'b6b4699f87d56126c9117a7da55bd0085246f4c56dbc95d20172612e9d38e8d7ca65e573a126ed88d4e30a46f80a666854d675cf3ba81de0de043c3774f061560f55edc256a787afe701677c0f602900',
+     '5b49b554d05c0cd5a5325376b3387de59d924fd1e13ded44648ab33c21349a603f25b84ec5ed887995b33da5e3bfcb87cd2f64521c4c62cf825cffabbe5d31cc'),
+    ('4ccd089b28ff96da9db6c346ec114e0f5b8a319f35aba624da8cf6ed4fb8a6fb', '72',
+     '3d4017c3e843895a92b70aa74d1b7ebc9c982ccf2ec4968cc0cd55f12af4660c',
+     'ae5b66bdf04b4c010bfe32b2fc126ead2107b697634f6f7337b9bff8785ee111200095ece87dde4dbe87343f6df3b107d91798c8a7eb1245d3bb9c5aafb093358c13e6ae1111a55717e895fd15f99f07',
+     '94f4487e1b2fec954309ef1289ecb2e15043a2461ecc7b2ae7d4470607ef82eb1cfa97d84991fe4a7bfdfd715606bc27e2967a6c557cfb5875879b671740b7d8'),
+    ('c5aa8df43f9f837bedb7442f31dcb7b166d38535076f094b85ce3a2e0b4458f7', 'af82',
+     'fc51cd8e6218a1a38da47ed00230f0580816ed13ba3303ac5deb911548908025',
+     'dfa2cba34b611cc8c833a6ea83b8eb1bb5e2ef2dd1b0c481bc42ff36ae7847f6ab52b976cfd5def172fa412defde270c8b8bdfbaae1c7ece17d9833b1bcf31064fff78ef493f820055b561ece45e1009',
+     '2031837f582cd17a9af9e0c7ef5a6540e3453ed894b62c293686ca3c1e319dde9d0aa489a4b59a9594fc2328bc3deff3c8a0929a369a72b1180a596e016b5ded'),
+]
+
+
+@pytest.fixture(params=list(ec.BACKENDS))
+def backend(request):
+    if request.param not in ec.available_backends():
+        pytest.skip("{} backend is not importable".format(request.param))
+    previous = ec.get_backend()
+    ec.set_backend(request.param)
+    yield request.param
+    ec.set_backend(previous)
+
+
+@pytest.mark.parametrize("sk, alpha, public_key, pi, beta", VECTORS)
+def test_backend_rfc_vectors(backend, sk, alpha, public_key, pi, beta):
+    sk, alpha = bytes.fromhex(sk), bytes.fromhex(alpha)
+    assert ec.get_public_key(sk).hex() == public_key
+    assert ec.ecvrf_prove(sk, alpha) == ("VALID", bytes.fromhex(pi))
+    assert ec.ecvrf_proof_to_hash(bytes.fromhex(pi)) == ("VALID", bytes.fromhex(beta))
+    assert ec.ecvrf_verify(bytes.fromhex(public_key), bytes.fromhex(pi), alpha) == ("VALID", bytes.fromhex(beta))
+
+
+def test_backend_matches_reference(backend):
+    rng = random.Random(8)
+    for _ in range(4):
+        sk = rng.getrandbits(256).to_bytes(32, 'little')
+        alpha = rng.getrandbits(256).to_bytes(32, 'little')
+        results = [ec.get_public_key(sk), ec.ecvrf_prove(sk, alpha)]
+        ec.set_backend("python")
+        assert results == [ec.get_public_key(sk), ec.ecvrf_prove(sk, alpha)]
+        ec.set_backend(backend)
+    assert ec._inverse(0) == 0
+
+
+def test_set_backend_unknown():
+    with pytest.raises(ValueError):
+        ec.set_backend("no-such-backend")
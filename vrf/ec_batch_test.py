@@ -0,0 +1,28 @@
+# Checks ecvrf_verify_batch against per item ecvrf_verify
+
+import random  # Intentionally deterministic
+
+import ec
+
+
+def test_verify_batch_matches_verify():
+    rng = random.Random(7)
+    items = []
+    for index in range(6):
+        sk = rng.getrandbits(256).to_bytes(32, 'little')
+        alpha_string = rng.getrandbits(256).to_bytes(32, 'little')
+        _, pi_string = ec.ecvrf_prove(sk, alpha_string)
+        items.append((ec.get_public_key(sk), pi_string, alpha_string))
+
+    # A corrupt s, a proof for the wrong alpha, a truncated proof and a gamma that does not decode
+    bad_pi = bytearray(items[1][1])
+    bad_pi[-1] ^= 0x01
+    items[1] = (items[1][0], bytes(bad_pi), items[1][2])
+    items[2] = (items[2][0], items[2][1], b'not the alpha')
+    items[3] = (items[3][0], items[3][1][:79], items[3][2])
+    items[4] = (items[4][0], bytes([2]) + bytes(31) + items[4][1][32:], items[4][2])
+
+    results = ec.ecvrf_verify_batch(items)
+    assert results == [ec.ecvrf_verify(*item) for item in items]
+    assert [status for status, _ in results] == ["VALID"] + ["INVALID"] * 4 + ["VALID"]
+    assert ec.ecvrf_verify_batch([]) == []
@@ -0,0 +1,15 @@
+# Checks that a VrfSigner proves exactly as the raw key does
+
+import random  # Intentionally deterministic
+
+import ec
+
+
+def test_signer_matches_raw_key():
+    rng = random.Random(9)
+    sk = rng.getrandbits(256).to_bytes(32, 'little')
+    signer = ec.VrfSigner(sk)
+    assert signer.public_key == ec.get_public_key(sk) == ec.get_public_key(signer)
+    for _ in range(3):
+        alpha_string = rng.getrandbits(256).to_bytes(32, 'little')
+        assert signer.prove(alpha_string) == ec.ecvrf_prove(signer, alpha_string) == ec.ecvrf_prove(sk, alpha_string)